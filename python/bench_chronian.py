@@ -0,0 +1,300 @@
+#!/usr/bin/python
+
+# Rough benchmarks for the Python implementation of chronian.
+# Run from this directory:  python bench_chronian.py
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 Michael Scott Kenniston
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import time
+from datetime import datetime, timedelta
+import tracemalloc
+import numpy
+import pytz
+from chronian import Chron, ChronClock
+
+
+def report(name, count, seconds, unit='ops'):
+    print('%-40s %12.0f %s/s' % (name, count / seconds, unit))
+
+
+def bench_point_memory(line, count=100000):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    points = [line.point(2016, 1 + i % 12, 1 + i % 28, i % 24)
+              for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('%-40s %12.0f bytes/point' % (
+        'point memory (%s)' % line.options()['time_zone_id'],
+        float(after - before) / len(points)))
+
+
+def bench_point_construction(line, count=100000):
+    start = time.time()
+    for i in range(count):
+        line.point(2016, 1 + i % 12, 1 + i % 28, i % 24)
+    report('point construction (%s)' % line.options()['time_zone_id'],
+           count, time.time() - start, 'points')
+
+
+def bench_array_fields(line, count=1000000):
+    micros = numpy.arange(count, dtype=numpy.int64) * 997 * 1000000
+    start = time.time()
+    array = line.point_array(micros)
+    for field in [array.year, array.month, array.day_of_month, array.hour,
+                  array.minute, array.second, array.fraction,
+                  array.day_of_week]:
+        field()
+    report('array, all fields (%s)' % line.options()['time_zone_id'],
+           count, time.time() - start, 'points')
+
+
+def bench_point_fields(line, count=100000):
+    points = [line.point(2016, 1 + i % 12, 1 + i % 28, i % 24)
+              for i in range(count)]
+    start = time.time()
+    for p in points:
+        (p.year(), p.month(), p.day_of_month(), p.hour(), p.minute(),
+         p.second(), p.fraction(), p.day_of_week())
+    report('points, all fields (%s)' % line.options()['time_zone_id'],
+           count, time.time() - start, 'points')
+
+
+def bench_conversion(source, target, count=1000000):
+    micros = numpy.arange(count, dtype=numpy.int64) * 997 * 1000000
+    array = source.point_array(micros)
+    start = time.time()
+    array.to(target).hour()
+    report('array.to(%s).hour()' % target.options()['time_zone_id'],
+           count, time.time() - start, 'points')
+    points = list(array[:count // 10])
+    start = time.time()
+    for p in points:
+        p.to(target).hour()
+    report('point.to(%s).hour()' % target.options()['time_zone_id'],
+           len(points), time.time() - start, 'points')
+
+
+def bench_parse_many(line, layout, count=1000000):
+    base = datetime(2016, 1, 1)
+    strings = [(base + timedelta(seconds=i * 997)).strftime(layout)
+               for i in range(count)]
+    start = time.time()
+    line.parse_many(strings)
+    report('parse_many %s' % layout, count, time.time() - start, 'strings')
+
+
+def bench_format(line, spec, count=1000000):
+    array = line.point_array(
+        numpy.arange(count, dtype=numpy.int64) * 997 * 1000000)
+    start = time.time()
+    array.format_many(spec)
+    report('format_many %s' % spec, count, time.time() - start, 'points')
+    points = list(array[:count // 10])
+    start = time.time()
+    for p in points:
+        p.format(spec)
+    report('format %s' % spec, len(points), time.time() - start, 'points')
+
+
+def bench_clock(line, count=1000000):
+    for name, clock in [('clock.read()', ChronClock(line)),
+                        ('clock.read(), 1ms tick', ChronClock(line, 1000))]:
+        read = clock.read
+        start = time.time()
+        for i in range(count):
+            read()
+        report(name, count, time.time() - start, 'reads')
+    clock = ChronClock(line)
+    start = time.time()
+    for i in range(count // 1000):
+        clock.read_many(1000)
+    report('clock.read_many(1000)', count, time.time() - start, 'stamps')
+
+
+def bench_sort(chron, count=1000000):
+    lines = [chron.line({'time_zone_id': tzid})
+             for tzid in ['Etc/UTC', 'America/New_York', 'Europe/Berlin']]
+    micros = numpy.random.randint(0, 10 ** 15, count, dtype=numpy.int64)
+    array = chron.record_array(b''.join(
+        line.point_array(micros[i::3]).to_bytes()
+        for i, line in enumerate(lines)))
+    start = time.time()
+    array.sorted()
+    report('records.sorted(), 3 zones', count, time.time() - start, 'points')
+    points = list(array[:count // 10])
+    start = time.time()
+    sorted(points, key=lambda p: p.sort_key())
+    report('sorted(points, key=sort_key)', len(points),
+           time.time() - start, 'points')
+
+
+def bench_durations(chron, line, count=1000000):
+    array = line.point_array(
+        numpy.arange(count, dtype=numpy.int64) * 997 * 1000000)
+    for name, duration in [('1 month', chron.months(1)),
+                           ('30 days', chron.days(30)),
+                           ('720 hours', chron.hours(720))]:
+        start = time.time()
+        array.plus(duration)
+        report('array.plus(%s)' % name, count, time.time() - start, 'points')
+    points = list(array[:count // 10])
+    duration = chron.months(1)
+    start = time.time()
+    for p in points:
+        p.plus(duration)
+    report('point.plus(1 month)', len(points), time.time() - start, 'points')
+
+
+def bench_datetime64(line, count=10000000):
+    for unit in ['us', 'ns']:
+        values = numpy.arange(count, dtype=numpy.int64).astype(
+            'datetime64[%s]' % unit)
+        start = time.time()
+        line.points_from_datetime64(values).to_datetime64()
+        report('datetime64[%s] round trip' % unit, count,
+               time.time() - start, 'values')
+    epoch = datetime(1970, 1, 1, tzinfo=pytz.utc)
+    datetimes = [epoch + timedelta(seconds=i) for i in range(count // 10)]
+    start = time.time()
+    line.from_datetimes(datetimes)
+    report('from_datetimes (UTC)', len(datetimes), time.time() - start,
+           'values')
+
+
+def bench_match(chron, line, count=1000000):
+    array = line.point_array(
+        numpy.arange(count, dtype=numpy.int64) * 997 * 1000000)
+    matcher = chron.day_of_week(Chron.MON).hour(9).minute(0).compile()
+    start = time.time()
+    matcher.mask(array)
+    report('matcher.mask (Mon 09:00)', count, time.time() - start, 'points')
+    points = list(array[:count // 10])
+    start = time.time()
+    [matcher.matches(p) for p in points]
+    report('matcher.matches (Mon 09:00)', len(points), time.time() - start,
+           'points')
+    points = list(array[:count // 10])
+    start = time.time()
+    [p.day_of_week() == Chron.MON and p.hour() == 9 and p.minute() == 0
+     for p in points]
+    report('fields in Python (Mon 09:00)', len(points), time.time() - start,
+           'points')
+
+
+def bench_truncation(line, count=1000000):
+    array = line.point_array(
+        numpy.arange(count, dtype=numpy.int64) * 997 * 1000000)
+    start = time.time()
+    array.start_of_day()
+    report('array.start_of_day', count, time.time() - start, 'points')
+    points = list(array[:count // 10])
+    start = time.time()
+    [p.start_of_day() for p in points]
+    report('point.start_of_day', len(points), time.time() - start, 'points')
+
+
+def bench_histogram(line, count=1000000):
+    array = line.point_array(
+        numpy.arange(count, dtype=numpy.int64) * 997 * 1000000)
+    start = time.time()
+    array.histogram(['day_of_week', 'hour'])
+    report('array.histogram (day of week, hour)', count,
+           time.time() - start, 'points')
+    points = list(array[:count // 10])
+    start = time.time()
+    counts = numpy.zeros((7, 24), dtype=numpy.int64)
+    for p in points:
+        counts[p.day_of_week(), p.hour()] += 1
+    report('histogram in Python', len(points), time.time() - start,
+           'points')
+
+
+def bench_points_from_fields(line, count=1000000):
+    days = numpy.arange(count, dtype=numpy.int64) % 28 + 1
+    hours = numpy.arange(count, dtype=numpy.int64) % 24
+    start = time.time()
+    line.points_from_fields(2016, 3, days, hours, 30)
+    report('line.points_from_fields', count, time.time() - start, 'points')
+    rows = list(zip(days[:count // 10].tolist(), hours[:count // 10].tolist()))
+    start = time.time()
+    [line.point(2016, 3, day, hour, 30) for day, hour in rows]
+    report('line.point per row', len(rows), time.time() - start, 'points')
+
+
+def bench_interval_set(line, count=1000000):
+    # bookings (one layer) and fully nested contract windows (a tree),
+    # queried where a few intervals match
+    steps = numpy.arange(count)
+    for label, firsts, lasts, probes in [
+            ('bookings', steps * 10, steps * 10 + 5, range(0, count, 997)),
+            ('nested', steps, 2 * count - steps,
+             range(2 * count - 1000, 2 * count))]:
+        start = time.time()
+        intervals = line.interval_set(line.point_array(firsts),
+                                      line.point_array(lasts))
+        report('interval_set, %s' % label, count, time.time() - start,
+               'intervals')
+        queries = list(line.point_array(list(probes)))
+        start = time.time()
+        for q in queries:
+            intervals.containing_point(q)
+        report('containing_point, %s' % label, len(queries),
+               time.time() - start, 'queries')
+
+
+def main():
+    chron = Chron()
+    for tzid in ['UTC', 'America/New_York']:
+        line = chron.line({'time_zone_id': tzid})
+        bench_point_memory(line)
+        bench_point_construction(line)
+        bench_point_fields(line)
+        bench_array_fields(line)
+    for scale in ['smear leap seconds', 'UTC leap seconds']:
+        line = chron.line({'time_zone_id': 'UTC', 'leap_seconds': scale})
+        print(scale)
+        bench_point_fields(line)
+        bench_array_fields(line)
+    bench_conversion(chron.line({'time_zone_id': 'UTC'}),
+                     chron.line({'time_zone_id': 'Europe/Berlin'}))
+    berlin = chron.line({'time_zone_id': 'Europe/Berlin'})
+    for layout in ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%fZ',
+                   '%Y-%m-%d %H:%M:%S+02:00']:
+        bench_parse_many(berlin, layout)
+    bench_parse_many(berlin, '%Y%m%dT%H%M%S', 100000)
+    bench_format(berlin, '%Y-%m-%dT%H:%M:%S.%f%:z')
+    bench_format(berlin, None)
+    bench_clock(berlin)
+    bench_sort(chron)
+    bench_durations(chron, berlin)
+    bench_datetime64(berlin)
+    bench_match(chron, berlin)
+    bench_truncation(berlin)
+    bench_histogram(berlin)
+    bench_points_from_fields(berlin)
+    bench_interval_set(berlin)
+
+
+if __name__ == '__main__':
+    main()
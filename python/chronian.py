@@ -26,8 +26,22 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from datetime import datetime
-from pytz import timezone, all_timezones
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from heapq import heappop, heappush
+from itertools import islice
+import json
+import mmap
+import os
+import re
+from zlib import crc32
+from threading import Lock
+from time import time_ns
+import numpy
+from pytz import timezone, utc, all_timezones_set, OLSON_VERSION
 
 
 class ChronianError(Exception):
@@ -54,6 +68,46 @@ class InvalidTimeZoneError(ChronianError):
     pass
 
 
+class ParseError(ChronianError):
+    pass
+
+
+class InvalidFormatSpecError(ChronianError):
+    pass
+
+
+class MissingShortIdError(ChronianError):
+    pass
+
+
+class InvalidShortIdError(ChronianError):
+    pass
+
+
+class InvalidStoreError(ChronianError):
+    pass
+
+
+class InvalidIntervalError(ChronianError):
+    pass
+
+
+class InfinitePointError(ChronianError):
+    pass
+
+
+class AmbiguousTimeError(ChronianError):
+    pass
+
+
+class NonExistentTimeError(ChronianError):
+    pass
+
+
+class FrozenSpecError(ChronianError):
+    pass
+
+
 # the first legal value is the default
 VALID_OPTION_VALUES = {
     'date_system': [
@@ -71,6 +125,787 @@ VALID_OPTION_VALUES = {
     }
 
 
+# ChronPoints count microseconds from this instant
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+MICROS_PER_SECOND = 1000000
+MICROS_PER_HOUR = 3600 * MICROS_PER_SECOND
+MICROS_PER_DAY = 86400 * MICROS_PER_SECOND
+SIX_HOURS = 6 * MICROS_PER_HOUR
+
+INT64_MIN = -2 ** 63
+
+# the infinite points lie past every representable instant (INT64_MIN
+# itself is left free to mean "not a time")
+POSITIVE_INFINITY = 2 ** 63 - 1
+NEGATIVE_INFINITY = -2 ** 63 + 1
+
+
+def finite_mask(micros):
+    # the rows of a column of micros that are neither infinite point
+    # (nor INT64_MIN)
+    return (micros > NEGATIVE_INFINITY) & (micros < POSITIVE_INFINITY)
+
+
+def micros_from_timedelta(delta):
+    return ((delta.days * 86400 + delta.seconds) * MICROS_PER_SECOND +
+            delta.microseconds)
+
+
+DATETIME64_US = numpy.dtype('datetime64[us]')
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def micros_from_datetimes(datetimes):
+    # POSIX microseconds for a sequence of aware datetimes.  Rows are
+    # grouped by tzinfo.  A tzinfo with one fixed offset (such as a
+    # datetime.timezone, or each of a pytz zone's localized tzinfos)
+    # needs one utcoffset() call for the whole group, as the wall-clock
+    # times come from differences with a datetime of the same tzinfo;
+    # any other tzinfo is asked for the offset of every row.
+    objects = numpy.empty(len(datetimes), dtype=object)
+    objects[:] = datetimes
+    micros = numpy.empty(len(objects), dtype=numpy.int64)
+    ids = numpy.fromiter((id(d.tzinfo) for d in objects),
+                         dtype=numpy.int64, count=len(objects))
+    ids, firsts, inverse = numpy.unique(ids, return_index=True,
+                                        return_inverse=True)
+    groups = {}
+    labels = numpy.array([groups.setdefault(objects[first].tzinfo,
+                                            len(groups))
+                          for first in firsts.tolist()])[inverse]
+    order = numpy.argsort(labels, kind='stable')
+    bounds = numpy.searchsorted(labels[order], numpy.arange(len(groups) + 1))
+    for tzinfo, label in groups.items():
+        rows = order[bounds[label]:bounds[label + 1]]
+        group = objects[rows]
+        if tzinfo is None or group[0].utcoffset() is None:
+            raise MissingTimeZoneError('datetimes must be aware')
+        fixed = tzinfo.utcoffset(None) is not None or \
+            hasattr(tzinfo, '_utcoffset')
+        epoch = EPOCH.replace(tzinfo=tzinfo if fixed else utc)
+        micros[rows] = numpy.fromiter(
+            ((d - epoch) // ONE_MICROSECOND for d in group),
+            dtype=numpy.int64, count=len(group))
+        if fixed:
+            micros[rows] -= micros_from_timedelta(group[0].utcoffset())
+    return micros
+
+
+# How to read a wall-clock time that happens twice (when the clocks go
+# back) or not at all (when they go forward).  As with PEP 495's fold,
+# 'earlier' reads a time with the offset from before the transition and
+# 'later' with the one after it, so that in a gap 'earlier' lands after
+# the gap and 'later' before it.  'shift forward' takes the earlier of
+# two times, and moves a skipped time to the instant the gap ends.
+# 'NaT', for whole columns of fields only, leaves either kind as
+# INT64_MIN; arithmetic such as plus() has to land on a point, so it
+# takes only the point policies.
+RESOLVE_EARLIER = 'earlier'
+RESOLVE_LATER = 'later'
+RESOLVE_SHIFT_FORWARD = 'shift forward'
+RESOLVE_RAISE = 'raise'
+RESOLVE_NAT = 'NaT'
+RESOLVE_POINT_POLICIES = (RESOLVE_EARLIER, RESOLVE_LATER,
+                          RESOLVE_SHIFT_FORWARD, RESOLVE_RAISE)
+RESOLVE_POLICIES = RESOLVE_POINT_POLICIES + (RESOLVE_NAT,)
+
+
+def check_policy(policy, policies=RESOLVE_POLICIES):
+    if policy not in policies:
+        raise InvalidOptionValueError('invalid policy "%s"' % policy)
+
+
+# Convert between days since the epoch and (year, month, day_of_month).
+# These use only integer arithmetic without branches (after H. Hinnant's
+# "chrono-compatible low-level date algorithms"), so the same code works
+# on plain ints and element-wise on numpy int64 arrays.
+
+def civil_from_days(days):
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 - 12 * (mp // 10)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def days_from_civil(year, month, day):
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def julian_civil_from_days(days):
+    # the same, for the Julian calendar's 4-year cycle of 1461 days
+    z = days + 719470
+    era = z // 1461
+    doe = z - era * 1461
+    yoe = (doe - doe // 1460) // 365
+    doy = doe - 365 * yoe
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 - 12 * (mp // 10)
+    year = yoe + era * 4 + (month <= 2)
+    return year, month, day
+
+
+def julian_days_from_civil(year, month, day):
+    year = year - (month <= 2)
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    return year * 365 + year // 4 + doy - 719470
+
+
+def day_of_week_from_days(days):
+    return (days + Chron.THU) % 7  # the epoch was a Thursday
+
+
+def add_months(calendar, days, months):
+    # the same day of the month, that many months later, or else the
+    # last day of that month; for ints or numpy arrays
+    year, month, day = calendar.civil_from_days(days)
+    total = year * 12 + month - 1 + months
+    first = calendar.days_from_civil(total // 12, total % 12 + 1, 1)
+    length = calendar.days_from_civil(
+        (total + 1) // 12, (total + 1) % 12 + 1, 1) - first
+    return first + day - 1 - (day > length) * (day - length)
+
+
+# Units for start_of() and round_to().  The time units are cut from the
+# local time of day; the others go by local date, via the line's cache
+# of the instants its days start at.
+TIME_UNITS = {
+    'hour': MICROS_PER_HOUR,
+    'minute': 60 * MICROS_PER_SECOND,
+    'second': MICROS_PER_SECOND,
+    }
+
+
+def start_day(calendar, days, unit):
+    # the first day of the unit holding each day; for ints or arrays
+    if unit == 'day':
+        return days
+    if unit == 'week':
+        return days - day_of_week_from_days(days)
+    year, month, day = calendar.civil_from_days(days)
+    if unit == 'month':
+        return days - day + 1
+    if unit == 'year':
+        return calendar.days_from_civil(year, 1, 1)
+    raise InvalidOptionValueError('invalid unit "%s"' % unit)
+
+
+def next_start_day(calendar, days, unit):
+    # the first day of the following unit, from the first day of one
+    if unit == 'day':
+        return days + 1
+    if unit == 'week':
+        return days + 7
+    return add_months(calendar, days, 1 if unit == 'month' else 12)
+
+
+class _Calendar(object):
+
+    # A date system, as a pair of the conversions above.  Both take and
+    # return plain ints or numpy arrays alike.
+
+    def __init__(self, days_from_civil, civil_from_days):
+        self.days_from_civil = days_from_civil
+        self.civil_from_days = civil_from_days
+
+    def valid(self, year, month, day):
+        # whether each date exists (and has a 4-digit year)
+        return (year >= 1) & (year <= 9999) & (month >= 1) & \
+            (month <= 12) & (day >= 1) & \
+            (self.civil_from_days(self.days_from_civil(year, month, day))[2]
+             == day)
+
+    def days(self, year, month, day):
+        # valid() for one date, skipping the round trip for days 1-28
+        days = self.days_from_civil(year, month, day)
+        if not (1 <= year <= 9999 and 1 <= month <= 12 and 1 <= day and
+                (day <= 28 or self.civil_from_days(days)[2] == day)):
+            raise ValueError('no such date %04d-%02d-%02d' %
+                             (year, month, day))
+        return days
+
+
+CALENDARS = {
+    'Proleptic Gregorian calendar': _Calendar(days_from_civil,
+                                              civil_from_days),
+    'Proleptic Julian calendar': _Calendar(julian_days_from_civil,
+                                           julian_civil_from_days),
+    }
+GREGORIAN = CALENDARS['Proleptic Gregorian calendar']
+
+
+def check_time_of_day(hour, minute, second, fraction):
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60 and
+            0 <= fraction < MICROS_PER_SECOND):
+        raise ValueError('no such time %02d:%02d:%02d.%06d' %
+                         (hour, minute, second, fraction))
+
+
+# A zone's offsets from UTC, compiled once out of pytz into sorted int64
+# arrays.  The same buffers serve scalar lookups (with bisect) and whole
+# columns of instants (with numpy.searchsorted), so neither has to go
+# through pytz.  The first transition is pushed back to the smallest
+# int64 so that every instant falls in some entry.
+
+class _ZoneTable(object):
+
+    def __init__(self, tz):
+        if hasattr(tz, '_utc_transition_times'):
+            times = tz._utc_transition_times
+            infos = tz._transition_info
+        else:
+            times = [datetime(1, 1, 1)]
+            infos = [(tz.utcoffset(None), tz.dst(None), tz.tzname(None))]
+        self.transitions = array('q', [INT64_MIN] + [
+            micros_from_timedelta(t - EPOCH) for t in times[1:]])
+        self.offsets = array('q', [
+            micros_from_timedelta(info[0]) for info in infos])
+        self.dst = [bool(info[1]) for info in infos]
+        self.abbreviations = [info[2] for info in infos]
+        self.transition_column = numpy.frombuffer(
+            self.transitions, dtype=numpy.int64)
+        self.offset_column = numpy.frombuffer(self.offsets, dtype=numpy.int64)
+        self.dst_column = numpy.array(self.dst, dtype=bool)
+        # the offset as +HHMM and +HH:MM, and the abbreviation, per entry
+        self.zone_strings = []
+        for offset, abbreviation in zip(self.offsets, self.abbreviations):
+            minutes = abs(offset) // (60 * MICROS_PER_SECOND)
+            sign = '-' if offset < 0 else '+'
+            self.zone_strings.append((
+                '%s%02d%02d' % (sign, minutes // 60, minutes % 60),
+                '%s%02d:%02d' % (sign, minutes // 60, minutes % 60),
+                abbreviation))
+        self.zone_string_columns = [
+            numpy.array([strings[i] for strings in self.zone_strings])
+            for i in range(3)]
+
+    def index(self, micros):
+        return bisect_right(self.transitions, micros) - 1
+
+    def utc_offset(self, micros):
+        return self.offsets[bisect_right(self.transitions, micros) - 1]
+
+    def indexes(self, micros):
+        return numpy.searchsorted(
+            self.transition_column, micros, side='right') - 1
+
+    def utc_offsets(self, micros):
+        return self.offset_column[self.indexes(micros)]
+
+    def local_micros(self, micros):
+        return micros + self.utc_offsets(micros)
+
+    def utc_micros(self, local):
+        # Same answer as pytz's localize(is_dst=False): try the offsets in
+        # effect a day either side, and keep those that give back this
+        # wall-clock time.  If there are two, prefer standard time and
+        # then the later instant.  If there are none, the time was
+        # skipped, so use the offset from six hours earlier.
+        if len(self.offsets) == 1:
+            return local - self.offsets[0]
+        candidates = []
+        for probe in (local - MICROS_PER_DAY, local + MICROS_PER_DAY):
+            offset = self.utc_offset(probe)
+            micros = local - offset
+            index = self.index(micros)
+            if self.offsets[index] == offset and \
+                    (micros, index) not in candidates:
+                candidates.append((micros, index))
+        if len(candidates) == 1:
+            return candidates[0][0]
+        if not candidates:
+            return self.utc_micros(local - SIX_HOURS) + SIX_HOURS
+        standard = [micros for micros, index in candidates
+                    if not self.dst[index]]
+        return max(standard or [micros for micros, index in candidates])
+
+    def local_candidates(self, local):
+        # the instants, in order, that have this wall-clock time
+        instants = []
+        for probe in (local - MICROS_PER_DAY, local + MICROS_PER_DAY):
+            offset = self.utc_offset(probe)
+            micros = local - offset
+            if self.utc_offset(micros) == offset and micros not in instants:
+                instants.append(micros)
+        return sorted(instants)
+
+    def resolve(self, local, policy):
+        instants = self.local_candidates(local)
+        if len(instants) == 1:
+            return instants[0]
+        if policy == RESOLVE_RAISE:
+            if instants:
+                raise AmbiguousTimeError('local time occurs twice')
+            raise NonExistentTimeError('local time does not exist')
+        if instants:
+            return instants[-1] if policy == RESOLVE_LATER else instants[0]
+        before = local - self.utc_offset(local - MICROS_PER_DAY)
+        if policy == RESOLVE_EARLIER:
+            return before
+        if policy == RESOLVE_LATER:
+            return local - self.utc_offset(local + MICROS_PER_DAY)
+        return self.transitions[self.index(before)]
+
+    def resolve_column(self, local, policy):
+        # resolve() for a whole column
+        return self.resolve_masked(local, policy)[0]
+
+    def resolve_masked(self, local, policy):
+        # resolve_column(), plus masks of the rows whose local time
+        # occurs twice and of those whose local time never occurs
+        local = numpy.asarray(local, dtype=numpy.int64)
+        if len(self.offsets) == 1:
+            never = numpy.zeros(local.shape, dtype=bool)
+            return local - self.offsets[0], never, never.copy()
+        before = self.utc_offsets(local - MICROS_PER_DAY)
+        after = self.utc_offsets(local + MICROS_PER_DAY)
+        first = local - before
+        second = local - after
+        first_ok = self.utc_offsets(first) == before
+        second_ok = (self.utc_offsets(second) == after) & (second != first)
+        ambiguous = first_ok & second_ok
+        missing = ~(first_ok | second_ok)
+        if policy == RESOLVE_RAISE:
+            if ambiguous.any():
+                raise AmbiguousTimeError('local time occurs twice')
+            if missing.any():
+                raise NonExistentTimeError('local time does not exist')
+        pick = numpy.maximum if policy == RESOLVE_LATER else numpy.minimum
+        result = numpy.where(ambiguous, pick(first, second),
+                             numpy.where(first_ok, first, second))
+        if policy == RESOLVE_NAT:
+            result[ambiguous | missing] = INT64_MIN
+        elif missing.any():
+            if policy == RESOLVE_EARLIER:
+                result[missing] = first[missing]
+            elif policy == RESOLVE_SHIFT_FORWARD:
+                result[missing] = self.transition_column[
+                    self.indexes(first[missing])]
+        return result, ambiguous, missing
+
+    def utc_micros_column(self, local):
+        # utc_micros() for a whole column, with at most two candidates
+        # per row and the same preferences between them
+        local = numpy.asarray(local, dtype=numpy.int64)
+        if len(self.offsets) == 1:
+            return local - self.offsets[0]
+        before = self.utc_offsets(local - MICROS_PER_DAY)
+        after = self.utc_offsets(local + MICROS_PER_DAY)
+        first = local - before
+        second = local - after
+        first_index = self.indexes(first)
+        second_index = self.indexes(second)
+        first_ok = self.offset_column[first_index] == before
+        second_ok = (self.offset_column[second_index] == after) & \
+            (second != first)
+        first_standard = ~self.dst_column[first_index]
+        second_standard = ~self.dst_column[second_index]
+        prefer_second = numpy.where(first_standard == second_standard,
+                                    second > first, second_standard)
+        result = numpy.where(first_ok & ~(second_ok & prefer_second),
+                             first, second)
+        skipped = ~(first_ok | second_ok)
+        if skipped.any():
+            result[skipped] = self.utc_micros_column(
+                local[skipped] - SIX_HOURS) + SIX_HOURS
+        return result
+
+
+class _DayStarts(object):
+
+    # The instant each local day of a line starts at (its midnight, or
+    # if that was skipped the end of the gap), as one int64 column over
+    # a range of day numbers that grows by at least a year at a time.
+    # A lookup is then just an index, whatever the zone's transitions.
+
+    PADDING = 366
+
+    def __init__(self, line):
+        self._line = line
+        self._range = (0, numpy.zeros(0, dtype=numpy.int64))
+
+    def _cover(self, low, high):
+        first, starts = self._range
+        if starts.size:
+            low = min(low, first)
+            high = max(high, first + len(starts) - 1)
+        low -= self.PADDING
+        high += self.PADDING
+        local = numpy.arange(low, high + 1, dtype=numpy.int64) * \
+            MICROS_PER_DAY
+        line = self._line
+        starts = line._from_civil_micros_column(
+            line._zone_table().resolve_column(local, RESOLVE_SHIFT_FORWARD))
+        self._range = (low, starts)
+        return self._range
+
+    def start(self, day):
+        first, starts = self._range
+        if not first <= day < first + len(starts):
+            first, starts = self._cover(day, day)
+        return int(starts[day - first])
+
+    def starts(self, days):
+        first, starts = self._range
+        if len(days) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        low, high = int(days.min()), int(days.max())
+        if not first <= low <= high < first + len(starts):
+            first, starts = self._cover(low, high)
+        return starts[days - first]
+
+
+_zone_tables = {}
+
+
+def zone_table(tzid):
+    table = _zone_tables.get(tzid)
+    if table is None:
+        table = _zone_tables.setdefault(tzid, _ZoneTable(timezone(tzid)))
+    return table
+
+
+# Leap seconds.  A line's 'leap_seconds' option picks the timescale its
+# points count microseconds in:
+#
+#   collapse - every day has 86400 seconds (POSIX time); a leap second
+#              collapses onto the midnight that follows it
+#   smear    - also 86400 seconds a day, but each leap second is spread
+#              evenly over the 24 hours from noon to noon around it
+#   UTC      - real elapsed seconds, so a leap second has microseconds of
+#              its own and its fields read 23:59:60
+#
+# Collapse and smear points decode exactly as before; only conversions
+# between timescales and UTC decoding look at the leap-second table.
+
+COLLAPSE_LEAP_SECONDS = 'collapse leap seconds'
+SMEAR_LEAP_SECONDS = 'smear leap seconds'
+UTC_LEAP_SECONDS = 'UTC leap seconds'
+
+# the days (in UTC) that began right after each leap second
+LEAP_SECOND_DAYS = [
+    (1972, 7, 1), (1973, 1, 1), (1974, 1, 1), (1975, 1, 1), (1976, 1, 1),
+    (1977, 1, 1), (1978, 1, 1), (1979, 1, 1), (1980, 1, 1), (1981, 7, 1),
+    (1982, 7, 1), (1983, 7, 1), (1985, 7, 1), (1988, 1, 1), (1990, 1, 1),
+    (1991, 1, 1), (1992, 7, 1), (1993, 7, 1), (1994, 7, 1), (1996, 1, 1),
+    (1997, 7, 1), (1999, 1, 1), (2006, 1, 1), (2009, 1, 1), (2012, 7, 1),
+    (2015, 7, 1), (2017, 1, 1),
+    ]
+
+NTP_EPOCH_SECONDS = 2208988800  # from 1900-01-01 to 1970-01-01
+HALF_DAY = 12 * MICROS_PER_HOUR
+
+
+class _LeapTable(object):
+
+    # Built from the POSIX instants of the midnights that end each leap
+    # second.  Every lookup is a bisect (or numpy.searchsorted) into one
+    # of the sorted columns below.
+
+    def __init__(self, ends):
+        second = MICROS_PER_SECOND
+        self.ends = array('q', ends)
+        # where each leap second starts, in UTC microseconds
+        self.starts = array('q', [end + k * second
+                                  for k, end in enumerate(ends)])
+        # each smear window, in UTC and in smeared microseconds
+        self.smear_starts = array('q', [start - HALF_DAY
+                                        for start in self.starts])
+        self.smear_ends = array('q', [start + HALF_DAY + second
+                                      for start in self.starts])
+        self.smeared_starts = array('q', [end - HALF_DAY for end in ends])
+        self.smeared_ends = array('q', [end + HALF_DAY for end in ends])
+        for name in ['ends', 'starts', 'smear_starts', 'smear_ends',
+                     'smeared_starts', 'smeared_ends']:
+            setattr(self, name + '_column',
+                    numpy.frombuffer(getattr(self, name), dtype=numpy.int64))
+
+    def utc_from_collapse(self, micros):
+        return micros + bisect_right(self.ends, micros) * MICROS_PER_SECOND
+
+    def collapse_from_utc(self, micros):
+        count = bisect_right(self.starts, micros)
+        if count and micros < self.starts[count - 1] + MICROS_PER_SECOND:
+            return self.ends[count - 1]
+        return micros - count * MICROS_PER_SECOND
+
+    def civil_from_utc(self, micros):
+        # the 86400-second-day count to decode fields from, which during
+        # a leap second repeats 23:59:59; and whether it is a leap second
+        count = bisect_right(self.starts, micros)
+        return (micros - count * MICROS_PER_SECOND,
+                count > 0 and
+                micros < self.starts[count - 1] + MICROS_PER_SECOND)
+
+    def smear_from_utc(self, micros):
+        k = bisect_right(self.smear_starts, micros) - 1
+        if k >= 0 and micros < self.smear_ends[k]:
+            return self.smeared_starts[k] + \
+                (micros - self.smear_starts[k]) * 86400 // 86401
+        return micros - \
+            bisect_right(self.smear_ends, micros) * MICROS_PER_SECOND
+
+    def utc_from_smear(self, micros):
+        # the earliest UTC instant that smears to micros
+        k = bisect_right(self.smeared_starts, micros) - 1
+        if k >= 0 and micros < self.smeared_ends[k]:
+            return self.smear_starts[k] - \
+                (self.smeared_starts[k] - micros) * 86401 // 86400
+        return micros + \
+            bisect_right(self.smeared_ends, micros) * MICROS_PER_SECOND
+
+    def utc_from_collapse_column(self, micros):
+        return micros + numpy.searchsorted(
+            self.ends_column, micros, side='right') * MICROS_PER_SECOND
+
+    def collapse_from_utc_column(self, micros):
+        count = numpy.searchsorted(self.starts_column, micros, side='right')
+        start = self.starts_column[numpy.maximum(count - 1, 0)]
+        inside = (count > 0) & (micros < start + MICROS_PER_SECOND)
+        return numpy.where(inside,
+                           self.ends_column[numpy.maximum(count - 1, 0)],
+                           micros - count * MICROS_PER_SECOND)
+
+    def civil_from_utc_column(self, micros):
+        count = numpy.searchsorted(self.starts_column, micros, side='right')
+        start = self.starts_column[numpy.maximum(count - 1, 0)]
+        return (micros - count * MICROS_PER_SECOND,
+                (count > 0) & (micros < start + MICROS_PER_SECOND))
+
+    def smear_from_utc_column(self, micros):
+        k = numpy.maximum(numpy.searchsorted(
+            self.smear_starts_column, micros, side='right') - 1, 0)
+        start = self.smear_starts_column[k]
+        inside = (micros >= start) & (micros < self.smear_ends_column[k])
+        smeared = self.smeared_starts_column[k] + \
+            (micros - start) * 86400 // 86401
+        return numpy.where(inside, smeared, micros - numpy.searchsorted(
+            self.smear_ends_column, micros, side='right') * MICROS_PER_SECOND)
+
+    def utc_from_smear_column(self, micros):
+        k = numpy.maximum(numpy.searchsorted(
+            self.smeared_starts_column, micros, side='right') - 1, 0)
+        start = self.smeared_starts_column[k]
+        inside = (micros >= start) & (micros < self.smeared_ends_column[k])
+        utc = self.smear_starts_column[k] - \
+            (start - micros) * 86401 // 86400
+        return numpy.where(inside, utc, micros + numpy.searchsorted(
+            self.smeared_ends_column, micros, side='right') *
+            MICROS_PER_SECOND)
+
+
+def read_leap_seconds(path):
+    # The days following each leap second, from a tzdata-style
+    # leap-seconds.list (NTP seconds and TAI - UTC on each line).
+    days = []
+    with open(path) as lines:
+        for line in lines:
+            fields = line.split('#', 1)[0].split()
+            if fields:
+                days.append(civil_from_days(
+                    (int(fields[0]) - NTP_EPOCH_SECONDS) // 86400))
+    return days[1:]  # the first line is where UTC began, not a leap
+
+
+_leap_tables = {}
+
+
+def leap_table(days=None):
+    # the table for the given days (e.g. from read_leap_seconds()), or
+    # else for the bundled LEAP_SECOND_DAYS
+    key = None if days is None else tuple(days)
+    table = _leap_tables.get(key)
+    if table is None:
+        ends = [days_from_civil(*day) * MICROS_PER_DAY
+                for day in (LEAP_SECOND_DAYS if days is None else days)]
+        table = _leap_tables.setdefault(key, _LeapTable(ends))
+    return table
+
+
+def convert_leap_seconds(micros, source, target, table=None):
+    # micros (an int) from one leap-second timescale to another;
+    # infinite points stay infinite
+    if source == target or not NEGATIVE_INFINITY < micros < POSITIVE_INFINITY:
+        return micros
+    table = leap_table() if table is None else table
+    if source == COLLAPSE_LEAP_SECONDS:
+        micros = table.utc_from_collapse(micros)
+    elif source == SMEAR_LEAP_SECONDS:
+        micros = table.utc_from_smear(micros)
+    if target == COLLAPSE_LEAP_SECONDS:
+        return table.collapse_from_utc(micros)
+    if target == SMEAR_LEAP_SECONDS:
+        return table.smear_from_utc(micros)
+    return micros
+
+
+def convert_leap_seconds_column(micros, source, target, table=None):
+    if source == target:
+        return micros
+    table = leap_table() if table is None else table
+    finite = finite_mask(micros)
+    converted = micros
+    if source == COLLAPSE_LEAP_SECONDS:
+        converted = table.utc_from_collapse_column(converted)
+    elif source == SMEAR_LEAP_SECONDS:
+        converted = table.utc_from_smear_column(converted)
+    if target == COLLAPSE_LEAP_SECONDS:
+        converted = table.collapse_from_utc_column(converted)
+    elif target == SMEAR_LEAP_SECONDS:
+        converted = table.smear_from_utc_column(converted)
+    return numpy.where(finite, converted, micros)
+
+
+# ISO-8601 parsing.  Strings in the common fixed-width layouts
+# (YYYY-MM-DDTHH:MM:SS, optionally with 3 or 6 fraction digits and a Z
+# or +HH:MM offset) are scanned a chunk at a time as a 2-D array of
+# character codes.  Anything else goes through the general regular
+# expression, one string at a time.
+
+PARSE_CHUNK_SIZE = 65536
+
+ISO_PATTERN = re.compile(
+    r'(\d{4})-?(\d{2})-?(\d{2})'
+    r'(?:[Tt ](\d{2}):?(\d{2})(?::?(\d{2})(?:[.,](\d+))?)?)?'
+    r'(?:([Zz])|([+-])(\d{2})(?::?(\d{2}))?)?')
+
+
+def parse_iso(string, calendar=GREGORIAN):
+    # returns the local wall-clock time, and the offset if there is one
+    match = ISO_PATTERN.fullmatch(string.strip())
+    if match is None:
+        raise ParseError('cannot parse "%s" as an ISO-8601 point' % string)
+    (year, month, day, hour, minute, second, fraction,
+     zulu, sign, offset_hours, offset_minutes) = match.groups()
+    try:
+        days = calendar.days(int(year), int(month), int(day))
+        check_time_of_day(int(hour or 0), int(minute or 0),
+                          int(second or 0), 0)
+    except ValueError:
+        raise ParseError('field out of range in "%s"' % string)
+    local = (((days * 24 + int(hour or 0)) * 60 +
+              int(minute or 0)) * 60 + int(second or 0)) * MICROS_PER_SECOND
+    if fraction:
+        local += int((fraction + '00000')[:6])
+    if zulu:
+        return local, 0
+    if sign:
+        offset = (int(offset_hours) * 60 + int(offset_minutes or 0)) * \
+            60 * MICROS_PER_SECOND
+        return local, -offset if sign == '-' else offset
+    return local, None
+
+
+class _IsoLayout(object):
+
+    def __init__(self, fraction_digits, offset):
+        pattern = 'dddd-dd-ddTdd:dd:dd'
+        if fraction_digits:
+            pattern += '.' + 'd' * fraction_digits
+        if offset:
+            pattern += 'Z' if offset == 'Z' else '+dd:dd'
+        self.length = len(pattern)
+        self.fraction_digits = fraction_digits
+        self.offset = offset
+        self.digits = [i for i, c in enumerate(pattern) if c == 'd']
+        self.literals = [i for i, c in enumerate(pattern) if c in '-:.Z']
+        self.literal_codes = [ord(pattern[i]) for i in self.literals]
+        self.sign = pattern.find('+')
+
+    def number(self, digits, first, count):
+        value = digits[:, first]
+        for i in range(first + 1, first + count):
+            value = value * 10 + digits[:, i]
+        return value
+
+    def scan(self, codes, calendar=GREGORIAN):
+        # returns which rows matched, their local times and their offsets
+        ok = (codes[:, self.literals] == self.literal_codes).all(axis=1)
+        ok &= (codes[:, 10] == ord('T')) | (codes[:, 10] == ord(' '))
+        digits = codes[:, self.digits].astype(numpy.int64) - ord('0')
+        ok &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+        year = self.number(digits, 0, 4)
+        month = self.number(digits, 4, 2)
+        day = self.number(digits, 6, 2)
+        ok &= calendar.valid(year, month, day)
+        days = calendar.days_from_civil(year, month, day)
+        hour = self.number(digits, 8, 2)
+        minute = self.number(digits, 10, 2)
+        second = self.number(digits, 12, 2)
+        ok &= (hour < 24) & (minute < 60) & (second < 60)
+        local = (((days * 24 + hour) * 60 + minute) * 60 + second) * \
+            MICROS_PER_SECOND
+        if self.fraction_digits:
+            local += self.number(digits, 14, self.fraction_digits) * \
+                10 ** (6 - self.fraction_digits)
+        offset = numpy.zeros(len(codes), dtype=numpy.int64)
+        if self.sign > 0:
+            first = 14 + self.fraction_digits
+            offset = (self.number(digits, first, 2) * 60 +
+                      self.number(digits, first + 2, 2)) * \
+                60 * MICROS_PER_SECOND
+            sign = codes[:, self.sign]
+            ok &= (sign == ord('+')) | (sign == ord('-'))
+            offset = numpy.where(sign == ord('-'), -offset, offset)
+        return ok, local, offset
+
+
+ISO_LAYOUTS = dict(
+    (layout.length, layout)
+    for layout in [_IsoLayout(fraction_digits, offset)
+                   for fraction_digits in (0, 3, 6)
+                   for offset in (None, 'Z', '+')])
+
+
+def scan_iso(strings, calendar=GREGORIAN):
+    # parse_iso() for a list of strings: returns the local wall-clock
+    # times, the offsets, and which rows had an offset
+    count = len(strings)
+    local = numpy.zeros(count, dtype=numpy.int64)
+    offset = numpy.zeros(count, dtype=numpy.int64)
+    has_offset = numpy.zeros(count, dtype=bool)
+    done = numpy.zeros(count, dtype=bool)
+    codes = numpy.array(strings)
+    if codes.dtype.kind in 'SU' and codes.dtype.itemsize > 0:
+        codes = codes.view(numpy.uint8 if codes.dtype.kind == 'S'
+                           else numpy.uint32).reshape(count, -1)
+        lengths = numpy.count_nonzero(codes, axis=1)
+        for length in numpy.unique(lengths).tolist():
+            layout = ISO_LAYOUTS.get(length)
+            if layout is None:
+                continue
+            rows = numpy.flatnonzero(lengths == length)
+            ok, row_local, row_offset = layout.scan(
+                codes[rows, :length], calendar)
+            rows = rows[ok]
+            local[rows] = row_local[ok]
+            offset[rows] = row_offset[ok]
+            has_offset[rows] = layout.offset is not None
+            done[rows] = True
+    for row in numpy.flatnonzero(~done).tolist():
+        string = strings[row]
+        if isinstance(string, bytes):
+            string = string.decode('ascii')
+        local[row], row_offset = parse_iso(string, calendar)
+        if row_offset is not None:
+            offset[row] = row_offset
+            has_offset[row] = True
+    return local, offset, has_offset
+
+
 def validate_options(options):
     for key in options:
         if key not in VALID_OPTION_VALUES:
@@ -105,19 +940,155 @@ class Chron:
     SAT = 5
     SUN = 6
 
-    def __init__(self, options={}):
+    # maximum number of distinct ChronLines remembered by line()
+    LINE_CACHE_SIZE = 256
+
+    # number of points a ChronPointStore buffers before writing
+    STORE_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, options={}, line_cache_size=LINE_CACHE_SIZE):
         validate_options(options)
         self._options = {}
         for key in VALID_OPTION_VALUES:
             values = VALID_OPTION_VALUES[key]
             self._options[key] = values[0] if values else None
         self._options.update(options)
+        self._leap_seconds = self._options['leap_seconds']
+        self._line_cache = OrderedDict()
+        self._line_cache_size = line_cache_size
+        self._line_cache_lock = Lock()
+        self._line_cache_hits = 0
+        self._line_cache_misses = 0
 
     def options(self):
         return self._options.copy()
 
+    def formatter(self, spec=None):
+        return compile_format(spec)
+
+    def duration_spec(self, years=0, months=0, weeks=0, days=0,
+                      hours=0, minutes=0, seconds=0, fractions=0):
+        return DurationSpec(years, months, weeks, days,
+                            hours, minutes, seconds, fractions)
+
+    def point_spec(self, year=None, month=None, day_of_month=None,
+                   hour=None, minute=None, second=None, fraction=None,
+                   day_of_week=None):
+        return PointSpec(year, month, day_of_month, hour, minute, second,
+                         fraction, day_of_week)
+
+    def year(self, value):
+        return PointSpec().year(value)
+
+    def month(self, value):
+        return PointSpec().month(value)
+
+    def day_of_month(self, value):
+        return PointSpec().day_of_month(value)
+
+    def hour(self, value):
+        return PointSpec().hour(value)
+
+    def minute(self, value):
+        return PointSpec().minute(value)
+
+    def second(self, value):
+        return PointSpec().second(value)
+
+    def fraction(self, value):
+        return PointSpec().fraction(value)
+
+    def day_of_week(self, value):
+        return PointSpec().day_of_week(value)
+
+    def years(self, value):
+        return DurationSpec().years(value)
+
+    def months(self, value):
+        return DurationSpec().months(value)
+
+    def weeks(self, value):
+        return DurationSpec().weeks(value)
+
+    def days(self, value):
+        return DurationSpec().days(value)
+
+    def hours(self, value):
+        return DurationSpec().hours(value)
+
+    def minutes(self, value):
+        return DurationSpec().minutes(value)
+
+    def seconds(self, value):
+        return DurationSpec().seconds(value)
+
+    def fractions(self, value):
+        return DurationSpec().fractions(value)
+
+    def create_store(self, path, chunk_size=STORE_CHUNK_SIZE):
+        os.makedirs(path)
+        for name, dtype in STORE_COLUMNS:
+            open(os.path.join(path, name), 'wb').close()
+        header = {'format': STORE_FORMAT, 'options': self.options(),
+                  'tzdata_version': OLSON_VERSION, 'count': 0,
+                  'sorted': True, 'last': None}
+        write_store_header(path, header)
+        return ChronPointStore().set_path(self, path, header, chunk_size)
+
+    def open_store(self, path, chunk_size=STORE_CHUNK_SIZE):
+        header = read_store_header(path)
+        if header['options'] != self.options():
+            raise InvalidStoreError(
+                'point store "%s" was written with other options' % path)
+        return ChronPointStore().set_path(self, path, header, chunk_size)
+
+    def _check_date_system(self, date_system):
+        # Records carry no date system, so they are only written for a
+        # Chron that will read their fields back the same way.
+        if date_system != self._options['date_system']:
+            raise InvalidOptionValueError(
+                'records of "%s" dates cannot be read as "%s" dates' %
+                (date_system, self._options['date_system']))
+
+    def record_array(self, buffer):
+        records = numpy.frombuffer(buffer, dtype=RECORD_DTYPE)
+        return ChronRecordArray().set_columns(
+            self, records['micros'], records['zone'])
+
     def line(self, options={}):
-        return ChronLine(self, options)
+        # ChronLines are immutable, so equal effective options can share
+        # one instance.  The cache is keyed on the merged options and
+        # evicts the least recently used line once it is full.
+        effective = self._options.copy()
+        effective.update(options)
+        try:
+            key = frozenset(effective.items())
+        except TypeError:  # unhashable value, let ChronLine report it
+            return ChronLine(self, options)
+        with self._line_cache_lock:
+            line = self._line_cache.get(key)
+            if line is not None:
+                self._line_cache.move_to_end(key)
+                self._line_cache_hits += 1
+                return line
+            self._line_cache_misses += 1
+        line = ChronLine(self, options)
+        if self._line_cache_size <= 0:
+            return line
+        with self._line_cache_lock:
+            line = self._line_cache.setdefault(key, line)
+            while len(self._line_cache) > self._line_cache_size:
+                self._line_cache.popitem(last=False)
+        return line
+
+    def line_cache_info(self):
+        with self._line_cache_lock:
+            return {
+                'hits': self._line_cache_hits,
+                'misses': self._line_cache_misses,
+                'size': len(self._line_cache),
+                'max_size': self._line_cache_size,
+                }
 
 
 class ChronLine:
@@ -130,12 +1101,25 @@ class ChronLine:
         if tzid is None:
             raise MissingTimeZoneError(
                 'time zone must be specified for ChronLine')
-        if tzid not in all_timezones:
+        if tzid not in all_timezones_set:
             raise InvalidTimeZoneError('invalid time zone "%s"' % tzid)
         self._time_zone = timezone(tzid)
-        keys = self._options.keys()
-        keys.sort()
+        self._table = None
+        self._starts = None
+        keys = sorted(self._options.keys())
         self._name = ", ".join([str(self._options[key]) for key in keys])
+        # Aliases of a zone (such as US/Eastern for America/New_York)
+        # hold the same values, and records decode to the primary name,
+        # so value equality and sort order go by the primary name.
+        primary = self._options.copy()
+        primary['time_zone_id'] = primary_zone_name(tzid)
+        self._value_name = ", ".join([str(primary[key]) for key in keys])
+        # breaks ties in sort order between simultaneous points on
+        # different lines; taken from the name so it is the same in
+        # every process
+        self._sort_rank = crc32(self._value_name.encode('utf-8'))
+        self._leap_seconds = self._options['leap_seconds']
+        self._calendar = CALENDARS[self._options['date_system']]
 
     def options(self):
         return self._options.copy()
@@ -146,71 +1130,2015 @@ class ChronLine:
     def time_zone(self):
         return self._time_zone
 
+    def short_id(self):
+        short_id = short_ids()[0].get(self._options['time_zone_id'])
+        if short_id is None:
+            raise MissingShortIdError('no short id for time zone "%s"' %
+                                      self._options['time_zone_id'])
+        return short_id
+
+    def _zone_table(self):
+        if self._table is None:
+            self._table = zone_table(self._options['time_zone_id'])
+        return self._table
+
+    def _day_starts(self):
+        if self._starts is None:
+            self._starts = _DayStarts(self)
+        return self._starts
+
+    def _from_civil_micros(self, micros):
+        # Counts built from wall-clock fields assume 86400-second days,
+        # which is already right for collapse and smear lines.
+        if self._leap_seconds != UTC_LEAP_SECONDS:
+            return micros
+        return convert_leap_seconds(micros, COLLAPSE_LEAP_SECONDS,
+                                    UTC_LEAP_SECONDS)
+
+    def _from_civil_micros_column(self, micros):
+        if self._leap_seconds != UTC_LEAP_SECONDS:
+            return micros
+        return convert_leap_seconds_column(micros, COLLAPSE_LEAP_SECONDS,
+                                           UTC_LEAP_SECONDS)
+
+    def _to_civil_micros(self, micros):
+        if self._leap_seconds != UTC_LEAP_SECONDS:
+            return micros
+        return leap_table().civil_from_utc(micros)[0]
+
+    def _shift_wall_clock(self, micros, months, days, policy):
+        # moves the local date, keeping the local time of day
+        table = self._zone_table()
+        civil = self._to_civil_micros(micros)
+        day, time = divmod(civil + table.utc_offset(civil), MICROS_PER_DAY)
+        day = add_months(self._calendar, day, months) + days
+        return self._from_civil_micros(
+            table.resolve(day * MICROS_PER_DAY + time, policy))
+
     def point(self,
               year=1, month=1, day_of_month=1,
               hour=0, minute=0, second=0, fraction=0):
         return ChronPoint().set_fields(self, year, month, day_of_month,
                                        hour, minute, second, fraction)
 
+    def point_array(self, epoch_micros):
+        return ChronPointArray().set_micros(self, epoch_micros)
+
+    def points_from_fields(self, years, months, days_of_month,
+                           hours=0, minutes=0, seconds=0, fractions=0,
+                           policy=RESOLVE_EARLIER):
+        # point() for columns of fields (scalars apply to every row),
+        # with wall-clock times that occur twice or not at all resolved
+        # by policy; also returns the masks of those two kinds of row
+        check_policy(policy)
+        columns = [numpy.asarray(column, dtype=numpy.int64).ravel()
+                   for column in numpy.broadcast_arrays(
+                       years, months, days_of_month,
+                       hours, minutes, seconds, fractions)]
+        year, month, day, hour, minute, second, fraction = columns
+        # second 60 is allowed only during a leap second on a UTC line
+        leap = None
+        if self._leap_seconds == UTC_LEAP_SECONDS:
+            leap = second == 60
+            second = numpy.where(leap, 59, second)
+        valid = self._calendar.valid(year, month, day) & \
+            (hour >= 0) & (hour < 24) & (minute >= 0) & (minute < 60) & \
+            (second >= 0) & (second < 60) & \
+            (fraction >= 0) & (fraction < MICROS_PER_SECOND)
+        if not valid.all():
+            row = int(numpy.flatnonzero(~valid)[0])
+            raise ValueError(
+                'no such time %04d-%02d-%02d %02d:%02d:%02d.%06d' %
+                tuple(int(column[row]) for column in columns))
+        days = self._calendar.days_from_civil(year, month, day)
+        local = ((days * 86400 + hour * 3600 + minute * 60 + second) *
+                 MICROS_PER_SECOND + fraction)
+        micros, ambiguous, missing = self._zone_table().resolve_masked(
+            local, policy)
+        times = micros != INT64_MIN
+        micros[times] = self._from_civil_micros_column(micros[times])
+        if leap is not None and leap.any():
+            leap &= times
+            micros[leap] += MICROS_PER_SECOND
+            if not leap_table().civil_from_utc_column(micros[leap])[1].all():
+                raise ValueError('no leap second at that time')
+        return self.point_array(micros), ambiguous, missing
+
+    def point_array_of(self, points):
+        return self.point_array([self._micros_of(point) for point in points])
+
+    def points_from_datetime64(self, values):
+        # datetime64 counts POSIX time; a [us] column is used in place
+        values = numpy.asarray(values)
+        if values.dtype.kind != 'M':
+            raise InvalidOptionValueError('expected datetime64 values')
+        if values.dtype != DATETIME64_US:
+            values = values.astype(DATETIME64_US)
+        return self.point_array(convert_leap_seconds_column(
+            values.view(numpy.int64), COLLAPSE_LEAP_SECONDS,
+            self._leap_seconds))
+
+    def from_datetimes(self, datetimes):
+        return self.point_array(convert_leap_seconds_column(
+            micros_from_datetimes(datetimes), COLLAPSE_LEAP_SECONDS,
+            self._leap_seconds))
+
+    def positive_infinity(self):
+        return ChronPoint().set_micros(self, POSITIVE_INFINITY)
 
-class ChronPoint:
+    def negative_infinity(self):
+        return ChronPoint().set_micros(self, NEGATIVE_INFINITY)
+
+    def interval_set(self, firsts, lasts):
+        return ChronIntervalSet().set_columns(
+            self, self._micros_of_column(firsts),
+            self._micros_of_column(lasts))
+
+    def interval_set_of(self, intervals):
+        intervals = list(intervals)
+        return ChronIntervalSet().set_columns(
+            self,
+            numpy.array([self._micros_of(i._first) for i in intervals],
+                        numpy.int64),
+            numpy.array([self._micros_of(i._last) for i in intervals],
+                        numpy.int64))
+
+    def _micros_of(self, point):
+        # a point's instant, from any line, on this line's timescale
+        return convert_leap_seconds(point._micros, point._parent._leap_seconds,
+                                    self._leap_seconds)
+
+    def _micros_of_column(self, points):
+        return convert_leap_seconds_column(
+            numpy.asarray(points._micros), points._parent._leap_seconds,
+            self._leap_seconds)
+
+    def recurrence(self, hour=0, minute=0, second=0, fraction=0,
+                   days_of_week=None, days_of_month=None, months=None,
+                   policy=RESOLVE_SHIFT_FORWARD):
+        return ChronRecurrence().set_rule(
+            self, hour, minute, second, fraction,
+            days_of_week, days_of_month, months, policy)
+
+    def transitions(self, first, last):
+        # each change of UTC offset in the interval [first, last), in
+        # order, as (point, old offset, new offset, new abbreviation)
+        # with the offsets in microseconds; found by bisecting the
+        # compiled table and then walking it only as far as asked
+        table = self._zone_table()
+        low = self._table_micros(first)
+        high = self._table_micros(last)
+        index = max(bisect_left(table.transitions, low), 1)
+        while index < len(table.transitions) and \
+                table.transitions[index] < high:
+            old, new = table.offsets[index - 1], table.offsets[index]
+            if old != new:
+                yield (ChronPoint().set_micros(
+                    self, self._from_civil_micros(table.transitions[index])),
+                    old, new, table.abbreviations[index])
+            index += 1
+
+    def _table_micros(self, point):
+        # a point as the 86400-second-day count the zone table is in
+        micros = point.to(self)._micros
+        if point.is_infinite():
+            return micros
+        return self._to_civil_micros(micros)
+
+    def parse(self, string):
+        local, offset = parse_iso(string, self._calendar)
+        if offset is None:
+            return ChronPoint().set_micros(self, self._from_civil_micros(
+                self._zone_table().utc_micros(local)))
+        return ChronPoint().set_micros(
+            self, self._from_civil_micros(local - offset))
+
+    def parse_many(self, strings):
+        table = self._zone_table()
+        strings = iter(strings)
+        columns = []
+        while True:
+            chunk = list(islice(strings, PARSE_CHUNK_SIZE))
+            if not chunk:
+                break
+            local, offset, has_offset = scan_iso(chunk, self._calendar)
+            micros = local - offset
+            rows = numpy.flatnonzero(~has_offset)
+            micros[rows] = table.utc_micros_column(local[rows])
+            columns.append(self._from_civil_micros_column(micros))
+        if not columns:
+            return self.point_array(numpy.zeros(0, dtype=numpy.int64))
+        return self.point_array(numpy.concatenate(columns))
+
+
+class ChronPoint(object):
+
+    # A point holds only its line and an integer count of microseconds
+    # since the (UTC) epoch.  The calendar fields are decoded the first
+    # time one of them is asked for, and remembered after that.
+    __slots__ = ('_parent', '_micros', '_fields', '_sort_key', '_hash')
 
     def __init__(self):
-        pass
+        self._fields = None
+        self._sort_key = None
+        self._hash = None
 
     def set_fields(self, parent,
                    year, month, day_of_month, hour, minute, second, fraction):
+        # second 60 is allowed only during a leap second on a UTC line
+        leap = second == 60 and parent._leap_seconds == UTC_LEAP_SECONDS
+        if leap:
+            second = 59
+        days = parent._calendar.days(year, month, day_of_month)
+        check_time_of_day(hour, minute, second, fraction)
+        local = ((days * 86400 + hour * 3600 + minute * 60 + second) *
+                 MICROS_PER_SECOND + fraction)
+        micros = parent._from_civil_micros(
+            parent._zone_table().utc_micros(local))
+        if leap:
+            micros += MICROS_PER_SECOND
+            if not leap_table().civil_from_utc(micros)[1]:
+                raise ValueError('no leap second at that time')
+        return self.set_micros(parent, micros)
+
+    def set_micros(self, parent, micros):
         self._parent = parent
-        self._internal = parent.time_zone().localize(datetime(
-            year, month, day_of_month, hour, minute, second, fraction))
+        self._micros = micros
+        self._fields = None
+        self._sort_key = None
+        self._hash = None
         return self
 
+    def _decode(self):
+        fields = self._fields
+        if fields is None:
+            micros = self._micros
+            if self.is_infinite():
+                raise InfinitePointError('an infinite point has no fields')
+            leap = False
+            if self._parent._leap_seconds == UTC_LEAP_SECONDS:
+                micros, leap = leap_table().civil_from_utc(micros)
+            table = self._parent._zone_table()
+            index = table.index(micros)
+            days, micros = divmod(micros + table.offsets[index],
+                                  MICROS_PER_DAY)
+            seconds, fraction = divmod(micros, MICROS_PER_SECOND)
+            minutes, second = divmod(seconds, 60)
+            hour, minute = divmod(minutes, 60)
+            fields = self._parent._calendar.civil_from_days(days) + (
+                hour, minute, second + leap, fraction,
+                day_of_week_from_days(days), index)
+            self._fields = fields
+        return fields
+
     def year(self):
-        return self._internal.year
+        return self._decode()[0]
 
     def month(self):
-        return self._internal.month
+        return self._decode()[1]
 
     def day_of_month(self):
-        return self._internal.day
+        return self._decode()[2]
 
     def hour(self):
-        return self._internal.hour
+        return self._decode()[3]
 
     def minute(self):
-        return self._internal.minute
+        return self._decode()[4]
 
     def second(self):
-        return self._internal.second
+        return self._decode()[5]
 
     def fraction(self):
-        return self._internal.microsecond
+        return self._decode()[6]
 
     def day_of_week(self):
-        return self._internal.weekday()
+        return self._decode()[7]
+
+    def is_infinite(self):
+        return not NEGATIVE_INFINITY < self._micros < POSITIVE_INFINITY
+
+    # Temporal order compares instants only; sort order also orders
+    # simultaneous points on different lines.  The keys are plain ints,
+    # so sorted(points, key=ChronPoint.sort_key) needs no comparisons.
+    # Lines count on their own leap-second timescales, so the keys are
+    # on the UTC one, which every other converts to without loss.  The
+    # sort key is worked out once and the temporal key read back from
+    # its high bits.
+
+    def temporal_key(self):
+        return self.sort_key() >> 32
+
+    def sort_key(self):
+        key = self._sort_key
+        if key is None:
+            key = self._sort_key = (convert_leap_seconds(
+                self._micros, self._parent._leap_seconds,
+                UTC_LEAP_SECONDS) << 32) | self._parent._sort_rank
+        return key
+
+    def _instants(self, other):
+        # both instants on a common timescale
+        if self._parent._leap_seconds == other._parent._leap_seconds:
+            return self._micros, other._micros
+        return self.temporal_key(), other.temporal_key()
+
+    def before(self, other):
+        micros, other_micros = self._instants(other)
+        return micros < other_micros
+
+    def before_simultaneous(self, other):
+        micros, other_micros = self._instants(other)
+        return micros <= other_micros
+
+    def simultaneous(self, other):
+        micros, other_micros = self._instants(other)
+        return micros == other_micros
+
+    def after_simultaneous(self, other):
+        micros, other_micros = self._instants(other)
+        return micros >= other_micros
+
+    def after(self, other):
+        micros, other_micros = self._instants(other)
+        return micros > other_micros
+
+    def sort_compare(self, other):
+        key, other_key = self.sort_key(), other.sort_key()
+        return (key > other_key) - (key < other_key)
+
+    # == and hash() are value equality: the same instant on lines with
+    # the same name, up to zone aliases.  For simultaneity, key sets and
+    # dicts on temporal_key() instead.
+
+    def __eq__(self, other):
+        if not isinstance(other, ChronPoint):
+            return NotImplemented
+        return self._micros == other._micros and \
+            self._parent._value_name == other._parent._value_name
+
+    def __hash__(self):
+        hashed = self._hash
+        if hashed is None:
+            hashed = self._hash = hash(self.sort_key())
+        return hashed
+
+    def plus(self, duration, policy=RESOLVE_EARLIER):
+        check_policy(policy, RESOLVE_POINT_POLICIES)
+        if self.is_infinite():
+            return self
+        months, days, elapsed = duration._parts()
+        micros = self._micros
+        if months or days:
+            micros = self._parent._shift_wall_clock(micros, months, days,
+                                                    policy)
+        return ChronPoint().set_micros(self._parent, micros + elapsed)
+
+    def minus(self, duration, policy=RESOLVE_EARLIER):
+        return self.plus(duration.negated(), policy)
+
+    def _civil_start(self, civil, unit):
+        # the start of the local hour, minute or second holding civil,
+        # or of the current offset if that came in later
+        table = self._parent._zone_table()
+        index = table.index(civil)
+        start = civil - (civil + table.offsets[index]) % TIME_UNITS[unit]
+        if table.utc_offset(start) != table.offsets[index]:
+            start = table.transitions[index]
+        return start
+
+    def start_of(self, unit):
+        # the first instant of the local year, month, week (from
+        # Monday), day, hour, minute or second holding this point
+        if self.is_infinite():
+            return self
+        line = self._parent
+        civil = line._to_civil_micros(self._micros)
+        if unit == 'second' and line._leap_seconds != SMEAR_LEAP_SECONDS:
+            # offsets and leap seconds both fall on whole seconds
+            micros = self._micros - self._micros % MICROS_PER_SECOND
+        elif unit in TIME_UNITS:
+            micros = line._from_civil_micros(self._civil_start(civil, unit))
+        else:
+            table = line._zone_table()
+            day = (civil + table.utc_offset(civil)) // MICROS_PER_DAY
+            micros = line._day_starts().start(
+                start_day(line._calendar, day, unit))
+        return ChronPoint().set_micros(line, micros)
+
+    def round_to(self, unit):
+        # the nearer of the start of this unit and the start of the
+        # next, taking the later one when they are equally near
+        if self.is_infinite():
+            return self
+        line = self._parent
+        start = self.start_of(unit)
+        if unit == 'second' and line._leap_seconds != SMEAR_LEAP_SECONDS:
+            following = start._micros + MICROS_PER_SECOND
+        elif unit in TIME_UNITS:
+            civil = line._to_civil_micros(start._micros)
+            following = line._from_civil_micros(self._civil_start(
+                civil + TIME_UNITS[unit], unit))
+        else:
+            following = line._day_starts().start(next_start_day(
+                line._calendar, start._day_number(), unit))
+        if following - self._micros <= self._micros - start._micros:
+            return ChronPoint().set_micros(line, following)
+        return start
+
+    def _day_number(self):
+        civil = self._parent._to_civil_micros(self._micros)
+        return (civil + self._parent._zone_table().utc_offset(civil)) // \
+            MICROS_PER_DAY
+
+    def start_of_day(self):
+        return self.start_of('day')
+
+    def start_of_hour(self):
+        return self.start_of('hour')
+
+    def start_of_week(self):
+        return self.start_of('week')
 
     def through(self, last):  # make interval
-        return [self, last]
+        return ChronInterval().set_points(self, last)
 
     def to(self, line):  # convert
-        other = ChronPoint()
-        other._parent = line
-        other_zone = other._parent.time_zone()
-        other._internal = other_zone.normalize(
-            self._internal.astimezone(other_zone))
-        return other
+        return ChronPoint().set_micros(line, convert_leap_seconds(
+            self._micros, self._parent._leap_seconds, line._leap_seconds))
 
     def format(self, spec=None):
-        return str(self._internal)
+        if self.is_infinite():
+            return 'infinity' if self._micros > 0 else '-infinity'
+        return compile_format(spec).format(self)
+
+    def to_bytes(self):
+        return ChronPointArray().set_micros(
+            self._parent, [self._micros]).to_bytes()
+
+
+class ChronPointArray(object):
+
+    # A column of points on one line, held as a read-only int64 array of
+    # microseconds since the epoch.  The local wall-clock times and the
+    # civil dates are decoded for the whole column on first use.
+
+    def __init__(self):
+        self._indexes = None
+        self._local = None
+        self._civil = None
+        self._civil_count = None
+        self._leap = None
+        self._all_finite = False
+
+    def set_micros(self, parent, micros):
+        micros = numpy.asarray(micros, dtype=numpy.int64).view()
+        micros.flags.writeable = False
+        self._parent = parent
+        self._micros = micros
+        self._indexes = None
+        self._local = None
+        self._civil = None
+        self._civil_count = None
+        self._leap = None
+        self._all_finite = False
+        return self
+
+    def line(self):
+        return self._parent
+
+    def epoch_micros(self):
+        return self._micros
+
+    def __len__(self):
+        return len(self._micros)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ChronPointArray().set_micros(
+                self._parent, self._micros[index])
+        return ChronPoint().set_micros(self._parent, int(self._micros[index]))
+
+    def __iter__(self):
+        for micros in self._micros.tolist():
+            yield ChronPoint().set_micros(self._parent, micros)
+
+    def sort_order(self):
+        # the stable permutation that puts the points in temporal order
+        # (which is also sort order, as they share a line)
+        return numpy.argsort(self._micros, kind='stable')
+
+    def sorted(self):
+        micros = self._micros
+        if len(micros) > 1 and (micros[1:] < micros[:-1]).any():
+            micros = micros[self.sort_order()]
+        return ChronPointArray().set_micros(self._parent, micros)
+
+    def unique(self):
+        # the distinct points, in temporal order
+        return ChronPointArray().set_micros(
+            self._parent, numpy.unique(self._micros))
+
+    def dedupe(self):
+        # the first of each set of equal points, in their original order
+        return ChronPointArray().set_micros(
+            self._parent, self._micros[first_occurrences(self._micros)])
+
+    def _civil_micros(self):
+        # on a UTC line, the 86400-second-day count (which repeats
+        # 23:59:59 through a leap second), noting where the leaps are
+        if self._parent._leap_seconds != UTC_LEAP_SECONDS:
+            return self._micros
+        if self._leap is None:
+            self._civil_count, self._leap = \
+                leap_table().civil_from_utc_column(self._micros)
+        return self._civil_count
+
+    def _zone_indexes(self):
+        if self._indexes is None:
+            self._indexes = self._parent._zone_table().indexes(
+                self._civil_micros())
+        return self._indexes
+
+    def _local_micros(self):
+        if self._local is None:
+            self._local = self._civil_micros() + \
+                self._parent._zone_table().offset_column[self._zone_indexes()]
+        return self._local
+
+    def _field_micros(self):
+        # the local micros to read fields from, as _local_micros(), but
+        # infinite points have no fields
+        if not self._all_finite:
+            if not finite_mask(self._micros).all():
+                raise InfinitePointError('an infinite point has no fields')
+            self._all_finite = True
+        return self._local_micros()
+
+    def _time_of_day(self):
+        return self._field_micros() % MICROS_PER_DAY
+
+    def _decode(self):
+        if self._civil is None:
+            civil = self._parent._calendar.civil_from_days(
+                self._field_micros() // MICROS_PER_DAY)
+            for column in civil:
+                column.flags.writeable = False
+            self._civil = civil
+        return self._civil
+
+    def year(self):
+        return self._decode()[0]
+
+    def month(self):
+        return self._decode()[1]
+
+    def day_of_month(self):
+        return self._decode()[2]
+
+    def hour(self):
+        return self._time_of_day() // MICROS_PER_HOUR
+
+    def minute(self):
+        return self._time_of_day() // (60 * MICROS_PER_SECOND) % 60
+
+    def second(self):
+        second = self._time_of_day() // MICROS_PER_SECOND % 60
+        if self._leap is not None:
+            second += self._leap
+        return second
+
+    def fraction(self):
+        return self._field_micros() % MICROS_PER_SECOND
+
+    def day_of_week(self):
+        return day_of_week_from_days(self._field_micros() // MICROS_PER_DAY)
+
+    def to(self, line):  # convert
+        # Unless the leap-second timescale changes the column is shared;
+        # converting means looking up the new wall-clock times in one pass.
+        other = ChronPointArray().set_micros(
+            line, convert_leap_seconds_column(
+                self._micros, self._parent._leap_seconds,
+                line._leap_seconds))
+        other._local_micros()
+        return other
+
+    def plus(self, duration, policy=RESOLVE_EARLIER):
+        check_policy(policy, RESOLVE_POINT_POLICIES)
+        months, days, elapsed = duration._parts()
+        micros = self._micros
+        finite = finite_mask(micros)
+        if not finite.all():
+            result = micros.copy()
+            result[finite] = ChronPointArray().set_micros(
+                self._parent, micros[finite]).plus(
+                    duration, policy).epoch_micros()
+        elif months or days:
+            line = self._parent
+            local = self._local_micros()
+            day = add_months(line._calendar, local // MICROS_PER_DAY,
+                             months) + days
+            result = line._from_civil_micros_column(
+                line._zone_table().resolve_column(
+                    day * MICROS_PER_DAY + local % MICROS_PER_DAY, policy))
+            result += elapsed
+        else:
+            result = micros + elapsed
+        return ChronPointArray().set_micros(self._parent, result)
+
+    def minus(self, duration, policy=RESOLVE_EARLIER):
+        return self.plus(duration.negated(), policy)
+
+    def _civil_starts(self, civil, unit):
+        table = self._parent._zone_table()
+        offsets = table.offset_column[table.indexes(civil)]
+        starts = civil - (civil + offsets) % TIME_UNITS[unit]
+        indexes = table.indexes(starts)
+        moved = table.offset_column[indexes] != offsets
+        if moved.any():
+            starts[moved] = table.transition_column[
+                table.indexes(civil[moved])]
+        return starts
+
+    def start_of(self, unit):
+        return ChronPointArray().set_micros(
+            self._parent, self._starts(unit)[0])
+
+    def _starts(self, unit):
+        # the start of each point's unit, and for non-infinite rows the
+        # start of the following one
+        line = self._parent
+        micros = self._micros
+        finite = finite_mask(micros)
+        starts = micros.copy()
+        following = micros.copy()
+        if unit == 'second' and line._leap_seconds != SMEAR_LEAP_SECONDS:
+            starts[finite] -= micros[finite] % MICROS_PER_SECOND
+            following[finite] = starts[finite] + MICROS_PER_SECOND
+        elif unit in TIME_UNITS:
+            civil = self._civil_micros()[finite]
+            civil_starts = self._civil_starts(civil, unit)
+            starts[finite] = line._from_civil_micros_column(civil_starts)
+            following[finite] = line._from_civil_micros_column(
+                self._civil_starts(civil_starts + TIME_UNITS[unit], unit))
+        else:
+            days = start_day(line._calendar,
+                             self._local_micros()[finite] // MICROS_PER_DAY,
+                             unit)
+            table = line._day_starts()
+            starts[finite] = table.starts(days)
+            following[finite] = table.starts(
+                next_start_day(line._calendar, days, unit))
+        return starts, following
+
+    def round_to(self, unit):
+        starts, following = self._starts(unit)
+        later = following - self._micros <= self._micros - starts
+        return ChronPointArray().set_micros(
+            self._parent, numpy.where(later, following, starts))
+
+    def start_of_day(self):
+        return self.start_of('day')
+
+    def start_of_hour(self):
+        return self.start_of('hour')
+
+    def start_of_week(self):
+        return self.start_of('week')
+
+    def bucket_ids(self, fields, line=None):
+        # each point's bucket for the values of the given fields (such
+        # as ['day_of_week', 'hour']) on this line or the given one,
+        # counting as bucket_shape() does; infinite points get -1
+        points = self if line is None else self.to(line)
+        micros = points._micros
+        finite = finite_mask(micros)
+        everything = finite.all()
+        if not everything:
+            points = points._parent.point_array(micros[finite])
+        shape = bucket_shape(fields)
+        ids = numpy.zeros(len(points), dtype=numpy.int64)
+        for field, count in zip(fields, shape):
+            ids *= count
+            ids += getattr(points, field)() - BUCKET_FIELDS[field][0]
+        if everything:
+            return ids
+        all_ids = numpy.full(len(micros), -1, dtype=numpy.int64)
+        all_ids[finite] = ids
+        return all_ids
+
+    def histogram(self, fields, line=None, values=None):
+        # how many points fall in each bucket, and optionally the sums
+        # of a column of values that runs alongside them
+        return bucket_histogram(self.bucket_ids(fields, line), fields, values)
+
+    def to_datetime64(self):
+        # a read-only datetime64[us] view of the same buffer, except on
+        # lines that count leap seconds differently from POSIX time or
+        # if there are infinite points, which become NaT
+        micros = convert_leap_seconds_column(
+            self._micros, self._parent._leap_seconds, COLLAPSE_LEAP_SECONDS)
+        finite = finite_mask(micros)
+        if not finite.all():
+            micros = numpy.where(finite, micros, INT64_MIN)
+            micros.flags.writeable = False
+        return micros.view(DATETIME64_US)
+
+    def format_many(self, spec=None, terminator='\n'):
+        return compile_format(spec).format_many(self, terminator)
+
+    def to_bytes(self):
+        return self.record_array().to_bytes()
+
+    def record_array(self, chron=None):
+        # Records only hold a zone, and are read back on the lines chron
+        # (by default this line's own) makes for it, so the instants are
+        # put on chron's leap-second timescale, and the line must use
+        # chron's date system.
+        if chron is None:
+            chron = self._parent._parent
+        chron._check_date_system(self._parent._options['date_system'])
+        codes = numpy.empty(len(self._micros), dtype=numpy.uint32)
+        codes.fill(zone_code_from_short_id(self._parent.short_id()))
+        return ChronRecordArray().set_columns(
+            chron, convert_leap_seconds_column(
+                self._micros, self._parent._leap_seconds, chron._leap_seconds),
+            codes)
+
+
+class DurationSpec(object):
+
+    # A plain, unvalidated record of how far to move a point.  Years,
+    # months, weeks and days move the local date and keep the local time
+    # of day (landing on the last day of a shorter month, and resolving
+    # skipped or repeated times with the caller's policy); hours,
+    # minutes, seconds and fractions are elapsed time, added to the
+    # instant.  So "1 day" across a DST change is 23 or 25 hours, but
+    # "24 hours" is always 24.
+
+    FIELDS = ('years', 'months', 'weeks', 'days',
+              'hours', 'minutes', 'seconds', 'fractions')
+
+    def __init__(self, years=0, months=0, weeks=0, days=0,
+                 hours=0, minutes=0, seconds=0, fractions=0):
+        self._values = [years, months, weeks, days,
+                        hours, minutes, seconds, fractions]
+        self._frozen = False
+
+    def _field(self, index, value):
+        if value is None:
+            return self._values[index]
+        if self._frozen:
+            raise FrozenSpecError('a frozen spec cannot be changed')
+        self._values[index] = value
+        return self
+
+    def years(self, value=None):
+        return self._field(0, value)
+
+    def months(self, value=None):
+        return self._field(1, value)
+
+    def weeks(self, value=None):
+        return self._field(2, value)
+
+    def days(self, value=None):
+        return self._field(3, value)
+
+    def hours(self, value=None):
+        return self._field(4, value)
+
+    def minutes(self, value=None):
+        return self._field(5, value)
+
+    def seconds(self, value=None):
+        return self._field(6, value)
+
+    def fractions(self, value=None):
+        return self._field(7, value)
+
+    def clone(self):
+        return DurationSpec(*self._values)
+
+    def frozen(self):
+        spec = self.clone()
+        spec._frozen = True
+        return spec
+
+    def negated(self):
+        return DurationSpec(*[-value for value in self._checked()])
+
+    def _checked(self):
+        # the values as ints, which they must be once the spec is used
+        for name, value in zip(self.FIELDS, self._values):
+            if not isinstance(value, (int, numpy.integer)):
+                raise InvalidOptionValueError(
+                    'duration %s must be a whole number, not %r' %
+                    (name, value))
+        return [int(value) for value in self._values]
+
+    def _parts(self):
+        # (months, days, elapsed microseconds)
+        (years, months, weeks, days,
+         hours, minutes, seconds, fractions) = self._checked()
+        return (years * 12 + months, weeks * 7 + days,
+                ((hours * 60 + minutes) * 60 + seconds) *
+                MICROS_PER_SECOND + fractions)
+
+
+class PointSpec(object):
+
+    # Point fields, any of which may be left as None.  As a pattern, a
+    # field matches its value (or any value in a set of them) and None
+    # matches anything; compile() turns the spec into a matcher.
+
+    FIELDS = ('year', 'month', 'day_of_month', 'hour', 'minute', 'second',
+              'fraction', 'day_of_week')
+
+    def __init__(self, year=None, month=None, day_of_month=None, hour=None,
+                 minute=None, second=None, fraction=None, day_of_week=None):
+        self._values = [year, month, day_of_month, hour, minute, second,
+                        fraction, day_of_week]
+        self._frozen = False
+
+    def _field(self, index, value):
+        if value is None:
+            return self._values[index]
+        if self._frozen:
+            raise FrozenSpecError('a frozen spec cannot be changed')
+        self._values[index] = value
+        return self
+
+    def year(self, value=None):
+        return self._field(0, value)
+
+    def month(self, value=None):
+        return self._field(1, value)
+
+    def day_of_month(self, value=None):
+        return self._field(2, value)
+
+    def hour(self, value=None):
+        return self._field(3, value)
+
+    def minute(self, value=None):
+        return self._field(4, value)
+
+    def second(self, value=None):
+        return self._field(5, value)
+
+    def fraction(self, value=None):
+        return self._field(6, value)
+
+    def day_of_week(self, value=None):
+        return self._field(7, value)
+
+    def clone(self):
+        return PointSpec(*self._values)
+
+    def frozen(self):
+        spec = self.clone()
+        spec._frozen = True
+        return spec
+
+    def compile(self):
+        return ChronPointMatcher(self._values)
+
+
+# how many values each point field can take, to guess how selective a
+# check on it is (years are guessed at a few centuries)
+FIELD_DOMAINS = [300, 12, 30.4, 24, 60, 60, 1000000, 7]
+
+# hour, minute, second and fraction from the microseconds into the day
+FIELD_UNITS = [MICROS_PER_HOUR, 60 * MICROS_PER_SECOND, MICROS_PER_SECOND, 1]
+FIELD_MODULI = [24, 60, 60, MICROS_PER_SECOND]
+
+# the point fields that can be bucketed on: (first value, value count)
+BUCKET_FIELDS = {
+    'month': (1, 12),
+    'day_of_month': (1, 31),
+    'day_of_week': (0, 7),
+    'hour': (0, 24),
+    'minute': (0, 60),
+    'second': (0, 61),
+    }
+
+
+def bucket_shape(fields):
+    # how many buckets each field has, e.g. (7, 24) for day of week
+    # then hour; a bucket id counts through them in row-major order
+    shape = []
+    for field in fields:
+        if field not in BUCKET_FIELDS:
+            raise InvalidOptionValueError(
+                'cannot bucket on "%s"' % (field,))
+        shape.append(BUCKET_FIELDS[field][1])
+    return tuple(shape)
+
+
+def bucket_histogram(ids, fields, values=None):
+    # counts of each bucket id (ignoring ids of -1), shaped by the
+    # fields, plus the float sums of values, one per id, if given
+    shape = bucket_shape(fields)
+    size = 1
+    for count in shape:
+        size *= count
+    ids = numpy.asarray(ids)
+    kept = ids >= 0
+    everything = kept.all()
+    if not everything:
+        ids = ids[kept]
+    counts = numpy.bincount(ids, minlength=size).reshape(shape)
+    if values is None:
+        return counts
+    values = numpy.asarray(values)
+    if not everything:
+        values = values[kept]
+    sums = numpy.bincount(ids, weights=values, minlength=size)
+    return counts, sums.reshape(shape)
+
+
+class ChronPointMatcher(object):
+
+    # A compiled PointSpec.  The checks run most selective first (the
+    # fewest matching values for the field's range), and mask() narrows
+    # the rows it still has to look at after each one, so the common
+    # fields of a rare pattern are decoded for only a few rows.
+
+    def __init__(self, values):
+        checks = []
+        for index, value in enumerate(values):
+            if value is None:
+                continue
+            allowed = frozenset(
+                [value] if isinstance(value, (int, numpy.integer))
+                else value)
+            checks.append((len(allowed) / FIELD_DOMAINS[index], index,
+                           allowed))
+        checks.sort()
+        self._checks = [(index, allowed) for _, index, allowed in checks]
+
+    def matches(self, point):
+        if point.is_infinite():
+            return False
+        fields = point._decode()
+        for index, allowed in self._checks:
+            if fields[index] not in allowed:
+                return False
+        return True
+
+    def mask(self, points):
+        micros = points.epoch_micros()
+        rows = numpy.flatnonzero(finite_mask(micros))
+        if self._checks:
+            local = points._local_micros()
+            leap = points._leap
+            calendar = points.line()._calendar
+        for index, allowed in self._checks:
+            if len(rows) == 0:
+                break
+            row_local = local[rows]
+            if index < 3:
+                column = calendar.civil_from_days(
+                    row_local // MICROS_PER_DAY)[index]
+            elif index == 7:
+                column = day_of_week_from_days(row_local // MICROS_PER_DAY)
+            else:
+                column = row_local % MICROS_PER_DAY // \
+                    FIELD_UNITS[index - 3] % FIELD_MODULI[index - 3]
+                if index == 5 and leap is not None:
+                    column = column + leap[rows]
+            if len(allowed) == 1:
+                keep = column == next(iter(allowed))
+            else:
+                keep = numpy.isin(column, list(allowed))
+            rows = rows[keep]
+        mask = numpy.zeros(len(micros), dtype=bool)
+        mask[rows] = True
+        return mask
+
+
+# Format specs use strftime-style directives.  Each spec is compiled
+# once into a ChronFormatter holding a %-template plus, per directive,
+# how to get its value from a decoded point or from a whole column.
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+             'Saturday', 'Sunday']
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November',
+               'December']
+DAY_ABBREVIATIONS = [name[:3] for name in DAY_NAMES]
+MONTH_ABBREVIATIONS = [name[:3] for name in MONTH_NAMES]
+
+# same as str() of a datetime: the fraction only appears if non-zero
+DEFAULT_FORMAT = '%Y-%m-%d %H:%M:%S%.f%:z'
+
+
+def _optional_fraction(fraction):
+    return '.%06d' % fraction if fraction else ''
+
+
+# directive: (template, width if fixed, scalar value, column value)
+FORMAT_DIRECTIVES = {
+    'Y': ('%04d', 4, lambda f, z: f[0], lambda a: a.year()),
+    'm': ('%02d', 2, lambda f, z: f[1], lambda a: a.month()),
+    'd': ('%02d', 2, lambda f, z: f[2], lambda a: a.day_of_month()),
+    'H': ('%02d', 2, lambda f, z: f[3], lambda a: a.hour()),
+    'M': ('%02d', 2, lambda f, z: f[4], lambda a: a.minute()),
+    'S': ('%02d', 2, lambda f, z: f[5], lambda a: a.second()),
+    'f': ('%06d', 6, lambda f, z: f[6], lambda a: a.fraction()),
+    '.f': ('%s', None, lambda f, z: _optional_fraction(f[6]),
+           lambda a: [_optional_fraction(f) for f in a.fraction().tolist()]),
+    'z': ('%s', 5, lambda f, z: z[0],
+          lambda a: a.line()._zone_table().zone_string_columns[0][
+              a._zone_indexes()]),
+    ':z': ('%s', 6, lambda f, z: z[1],
+           lambda a: a.line()._zone_table().zone_string_columns[1][
+               a._zone_indexes()]),
+    'Z': ('%s', None, lambda f, z: z[2],
+          lambda a: a.line()._zone_table().zone_string_columns[2][
+              a._zone_indexes()]),
+    'a': ('%s', 3, lambda f, z: DAY_ABBREVIATIONS[f[7]],
+          lambda a: numpy.array(DAY_ABBREVIATIONS)[a.day_of_week()]),
+    'A': ('%s', None, lambda f, z: DAY_NAMES[f[7]],
+          lambda a: numpy.array(DAY_NAMES)[a.day_of_week()]),
+    'b': ('%s', 3, lambda f, z: MONTH_ABBREVIATIONS[f[1] - 1],
+          lambda a: numpy.array(MONTH_ABBREVIATIONS)[a.month() - 1]),
+    'B': ('%s', None, lambda f, z: MONTH_NAMES[f[1] - 1],
+          lambda a: numpy.array(MONTH_NAMES)[a.month() - 1]),
+    }
+
+
+class ChronFormatter(object):
+
+    def __init__(self, spec):
+        self._spec = spec
+        self._template = []
+        self._literals = []
+        self._directives = []
+        literal = []
+        i = 0
+        while i < len(spec):
+            c = spec[i]
+            i += 1
+            if c != '%':
+                literal.append(c)
+                continue
+            for name in (spec[i:i + 2], spec[i:i + 1]):
+                if name in FORMAT_DIRECTIVES or name == '%':
+                    break
+            else:
+                raise InvalidFormatSpecError(
+                    'invalid directive at %d in format spec "%s"' %
+                    (i - 1, spec))
+            i += len(name)
+            if name == '%':
+                literal.append('%')
+                continue
+            self._literals.append(''.join(literal))
+            self._template.append(''.join(literal).replace('%', '%%'))
+            self._template.append(FORMAT_DIRECTIVES[name][0])
+            self._directives.append(FORMAT_DIRECTIVES[name])
+            literal = []
+        self._literals.append(''.join(literal))
+        self._template.append(''.join(literal).replace('%', '%%'))
+        self._template = ''.join(self._template)
+        self._scalars = [directive[2] for directive in self._directives]
+        self._fixed_width = all(directive[1] for directive in
+                                self._directives)
+
+    def spec(self):
+        return self._spec
+
+    def format(self, point):
+        fields = point._decode()
+        zone = point._parent._zone_table().zone_strings[fields[8]]
+        return self._template % tuple([value(fields, zone)
+                                       for value in self._scalars])
+
+    def format_many(self, points, terminator='\n'):
+        # Writes every point, each followed by the terminator, into one
+        # string.  If every value has a fixed width the whole output is
+        # assembled in one array of bytes.  Infinite points are written
+        # as format() writes them, around the rows of the finite ones.
+        if len(points) == 0:
+            return ''
+        micros = points.epoch_micros()
+        finite = finite_mask(micros)
+        if not finite.all():
+            rows = numpy.where(micros > 0, 'infinity', '-infinity') \
+                .astype(object)
+            if finite.any():
+                finite_points = points.line().point_array(micros[finite])
+                rows[finite] = self._format_rows(
+                    self._columns(finite_points), len(finite_points),
+                    self._template)
+            return ''.join([row + terminator for row in rows.tolist()])
+        columns = self._columns(points)
+        if self._fixed_width and all(
+                _fits_width(column, directive[1])
+                for column, directive in zip(columns, self._directives)):
+            return self._format_fixed_width(columns, len(points), terminator)
+        return ''.join(self._format_rows(
+            columns, len(points),
+            self._template + terminator.replace('%', '%%')))
+
+    def _columns(self, points):
+        return [directive[3](points) for directive in self._directives]
+
+    def _format_rows(self, columns, count, template):
+        if not columns:
+            return [template % ()] * count
+        rows = zip(*[column.tolist() if isinstance(column, numpy.ndarray)
+                     else column for column in columns])
+        return [template % row for row in rows]
+
+    def _format_fixed_width(self, columns, count, terminator):
+        pieces = []
+        for literal, column, directive in zip(
+                self._literals, columns, self._directives):
+            pieces.append(_byte_row(literal))
+            width = directive[1]
+            if column.dtype.kind == 'i':
+                pieces.append(numpy.stack(
+                    [column // 10 ** (width - 1 - i) % 10 + ord('0')
+                     for i in range(width)], axis=1).astype(numpy.uint8))
+            else:
+                pieces.append(column.astype('S%d' % width).view(
+                    numpy.uint8).reshape(count, width))
+        pieces.append(_byte_row(self._literals[-1] + terminator))
+        buffer = numpy.empty((count, sum(piece.shape[-1] for piece in pieces)),
+                             dtype=numpy.uint8)
+        start = 0
+        for piece in pieces:
+            buffer[:, start:start + piece.shape[-1]] = piece
+            start += piece.shape[-1]
+        return buffer.tobytes().decode('utf-8')
+
+
+def _fits_width(column, width):
+    if column.dtype.kind == 'i':
+        return column.min() >= 0 and column.max() < 10 ** width
+    return bool((numpy.char.str_len(column) == width).all())
+
+
+def _byte_row(text):
+    return numpy.frombuffer(text.encode('utf-8'), dtype=numpy.uint8)
+
+
+@lru_cache(maxsize=256)
+def compile_format(spec=None):
+    return ChronFormatter(DEFAULT_FORMAT if spec is None else spec)
+
+
+# Points can be stored as fixed-width binary records: the int64 count
+# of microseconds (little-endian) followed by the zone's short ID from
+# src/short_ids.csv, packed into a 32-bit code as up to four ASCII
+# characters (big-endian, NUL-padded, so the ID is readable in a dump).
+
+RECORD_DTYPE = numpy.dtype([('micros', '<i8'), ('zone', '>u4')])
+
+SHORT_IDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              os.pardir, 'src', 'short_ids.csv')
+
+_short_ids = None
+
+
+def short_ids():
+    # returns {zone name: short id} and {short id: primary zone name}
+    global _short_ids
+    if _short_ids is None:
+        short_id_from_name = {}
+        name_from_short_id = {}
+        with open(SHORT_IDS_PATH) as fh:
+            for line in fh:
+                if line[0] == '#':
+                    continue
+                fields = line.rstrip().split(',')
+                name_from_short_id[fields[1]] = fields[2]
+                for name in fields[2:]:
+                    short_id_from_name[name] = fields[1]
+        _short_ids = (short_id_from_name, name_from_short_id)
+    return _short_ids
+
+
+_ZONE_DATA = ('_utc_transition_times', '_transition_info', '_utcoffset',
+              '_tzname')
+
+
+def primary_zone_name(tzid):
+    # the zone name a record of tzid decodes to, if that zone has the
+    # same rules (some rows of the table join zones that only share a
+    # short id); tzid itself if it has no such alias, or if the table
+    # is not installed (so there are no records to decode and lines
+    # work without it)
+    try:
+        short_id_from_name, name_from_short_id = short_ids()
+    except OSError:
+        return tzid
+    primary = name_from_short_id.get(short_id_from_name.get(tzid), tzid)
+    if primary == tzid or primary not in all_timezones_set:
+        return tzid
+    zone, other = timezone(tzid), timezone(primary)
+    if zone is not other and any(getattr(zone, name, None) !=
+                                 getattr(other, name, None)
+                                 for name in _ZONE_DATA):
+        return tzid
+    return primary
+
+
+def zone_code_from_short_id(short_id):
+    return int.from_bytes(short_id.encode('ascii').ljust(4, b'\0'), 'big')
+
+
+def short_id_from_zone_code(code):
+    return int(code).to_bytes(4, 'big').rstrip(b'\0').decode('ascii')
+
+
+class ChronRecordArray(object):
+
+    # A read-only view of point records as an epoch column and a
+    # zone-code column, e.g. over bytes, a memoryview or an mmap.
+    # Nothing is parsed until a point or column is asked for.
+
+    def set_columns(self, parent, micros, codes):
+        self._parent = parent
+        self._micros = micros
+        self._codes = codes
+        self._lines = {}
+        return self
+
+    def __len__(self):
+        return len(self._micros)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ChronRecordArray().set_columns(
+                self._parent, self._micros[index], self._codes[index])
+        return ChronPoint().set_micros(self._line(int(self._codes[index])),
+                                       int(self._micros[index]))
+
+    def __iter__(self):
+        for i in range(len(self._micros)):
+            yield self[i]
+
+    def _line(self, code):
+        line = self._lines.get(code)
+        if line is None:
+            short_id = short_id_from_zone_code(code)
+            tzid = short_ids()[1].get(short_id)
+            if tzid is None:
+                raise InvalidShortIdError('invalid short id "%s"' % short_id)
+            line = self._parent.line({'time_zone_id': tzid})
+            self._lines[code] = line
+        return line
+
+    def epoch_micros(self):
+        return self._micros
+
+    def zone_codes(self):
+        return self._codes
+
+    def lines(self):
+        codes = self.zone_codes()
+        if len(codes) > 0 and (codes == codes[0]).all():
+            return [self._line(int(codes[0]))]
+        return [self._line(code) for code in numpy.unique(codes).tolist()]
+
+    def sort_ranks(self):
+        # each record's line's sort rank, as a uint32 column
+        codes = self.zone_codes()
+        uniques, inverse = numpy.unique(codes, return_inverse=True)
+        ranks = numpy.array([self._line(code)._sort_rank
+                             for code in uniques.tolist()], dtype=numpy.uint32)
+        return ranks[inverse]
+
+    def sort_order(self):
+        # the stable permutation that puts the records in sort order:
+        # by instant, then by line for simultaneous records in
+        # different zones (only looked at if there are any)
+        micros = self.epoch_micros()
+        order = numpy.argsort(micros, kind='stable')
+        codes = self.zone_codes()
+        if len(codes) > 1 and not (codes == codes[0]).all():
+            ordered = micros[order]
+            if (ordered[1:] == ordered[:-1]).any():
+                order = numpy.lexsort((self.sort_ranks(), micros))
+        return order
+
+    def sorted(self):
+        order = self.sort_order()
+        return ChronRecordArray().set_columns(
+            self._parent, self._micros[order], self._codes[order])
+
+    def dedupe(self):
+        # the first of each set of records with the same instant and
+        # zone, in their original order
+        keep = first_occurrences(self._micros, self._codes)
+        return ChronRecordArray().set_columns(
+            self._parent, self._micros[keep], self._codes[keep])
+
+    def point_array(self, line=None):
+        # all the points, on the given line or else on their common one
+        if line is None:
+            lines = self.lines()
+            if len(lines) != 1:
+                raise InvalidShortIdError(
+                    'records hold %d zones, not one' % len(lines))
+            line = lines[0]
+        return line.point_array(self.epoch_micros())
+
+    def point_arrays(self):
+        # {line: points on that line}, keeping each line's record order
+        codes = self.zone_codes()
+        micros = self.epoch_micros()
+        arrays = {}
+        for code in numpy.unique(codes).tolist():
+            line = self._line(code)
+            arrays[line] = line.point_array(micros[codes == code])
+        return arrays
+
+    def bucket_ids(self, fields, line=None):
+        # as for a point array, with the records read on the given line
+        # or else each on the wall clock of its own zone
+        micros = self.epoch_micros()
+        if line is not None:
+            return line.point_array(convert_leap_seconds_column(
+                micros, self._parent._leap_seconds, line._leap_seconds)
+                ).bucket_ids(fields)
+        codes = self.zone_codes()
+        if len(codes) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        if (codes == codes[0]).all():
+            return self.point_array().bucket_ids(fields)
+        uniques, inverse = numpy.unique(codes, return_inverse=True)
+        order = numpy.argsort(inverse, kind='stable')
+        bounds = numpy.searchsorted(inverse[order],
+                                    numpy.arange(len(uniques) + 1))
+        ids = numpy.empty(len(codes), dtype=numpy.int64)
+        for label, code in enumerate(uniques.tolist()):
+            rows = order[bounds[label]:bounds[label + 1]]
+            ids[rows] = self._line(code).point_array(
+                micros[rows]).bucket_ids(fields)
+        return ids
+
+    def histogram(self, fields, line=None, values=None):
+        return bucket_histogram(self.bucket_ids(fields, line), fields, values)
+
+    def to_bytes(self):
+        records = numpy.empty(len(self._micros), dtype=RECORD_DTYPE)
+        records['micros'] = self._micros
+        records['zone'] = self._codes
+        return records.tobytes()
+
+
+def first_occurrences(micros, codes=None):
+    # The ascending positions of the first of each run of equal
+    # (micros, code) pairs.  A column that is already strictly
+    # increasing is returned whole without sorting.
+    if len(micros) < 2 or (micros[1:] > micros[:-1]).all():
+        return numpy.arange(len(micros))
+    if codes is None:
+        order = numpy.argsort(micros, kind='stable')
+        ordered = micros[order]
+        new = ordered[1:] != ordered[:-1]
+    else:
+        order = numpy.lexsort((codes, micros))
+        ordered, ordered_codes = micros[order], codes[order]
+        new = (ordered[1:] != ordered[:-1]) | \
+            (ordered_codes[1:] != ordered_codes[:-1])
+    keep = order[numpy.concatenate([[True], new])]
+    keep.sort()
+    return keep
+
+
+# A point store is a directory holding one file per column (epoch
+# microseconds and zone codes, in native int64 and uint32) plus a JSON
+# header giving the Chron options, the tzdata version and how many rows
+# have been committed.  The columns are read through mmap, so views and
+# slices are never copied and only the pages actually touched are read.
+# Appends are buffered and written a chunk at a time; the header is
+# rewritten after the column files, so a torn append is never seen.
+
+STORE_FORMAT = 'chronian point store 1'
+STORE_HEADER = 'header.json'
+STORE_COLUMNS = [('micros.i8', numpy.int64), ('zones.u4', numpy.uint32)]
+
+
+class ChronPointStore(object):
+
+    def __init__(self):
+        self._pending = []
+        self._pending_count = 0
+        self._columns = None
+
+    def set_path(self, parent, path, header, chunk_size):
+        self._parent = parent
+        self._path = path
+        self._header = header
+        self._chunk_size = chunk_size
+        return self
+
+    def path(self):
+        return self._path
+
+    def options(self):
+        return self._header['options'].copy()
+
+    def tzdata_version(self):
+        return self._header['tzdata_version']
+
+    def is_sorted(self):
+        self.flush()
+        return self._header['sorted']
+
+    def __len__(self):
+        return self._header['count'] + self._pending_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def append(self, points):
+        # takes a ChronPoint, ChronPointArray or ChronRecordArray
+        if isinstance(points, ChronPoint):
+            points = ChronPointArray().set_micros(
+                points._parent, [points._micros])
+        if isinstance(points, ChronPointArray):
+            points = points.record_array(self._parent)
+        self._parent._check_date_system(
+            points._parent._options['date_system'])
+        self._pending.append((convert_leap_seconds_column(
+            points.epoch_micros(), points._parent._leap_seconds,
+            self._parent._leap_seconds), points.zone_codes()))
+        self._pending_count += len(points)
+        if self._pending_count >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        micros = numpy.concatenate([p[0] for p in self._pending])
+        codes = numpy.concatenate([p[1] for p in self._pending])
+        self._pending = []
+        self._pending_count = 0
+        header = self._header
+        count = header['count']
+        for (name, dtype), column in zip(STORE_COLUMNS, [micros, codes]):
+            with open(os.path.join(self._path, name), 'r+b') as fh:
+                fh.seek(count * numpy.dtype(dtype).itemsize)
+                fh.write(numpy.ascontiguousarray(column, dtype=dtype).data)
+                fh.truncate()
+        if len(micros) > 0:
+            if header['last'] is not None:
+                header['sorted'] = header['sorted'] and \
+                    bool(micros[0] >= header['last'])
+            header['sorted'] = header['sorted'] and \
+                bool((micros[1:] >= micros[:-1]).all())
+            header['last'] = int(micros[-1])
+        header['count'] = count + len(micros)
+        write_store_header(self._path, header)
+        self._columns = None
+
+    def _mapped(self):
+        self.flush()
+        if self._columns is None:
+            count = self._header['count']
+            columns = []
+            for name, dtype in STORE_COLUMNS:
+                if count == 0:
+                    columns.append(numpy.zeros(0, dtype=dtype))
+                    continue
+                with open(os.path.join(self._path, name), 'rb') as fh:
+                    buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                columns.append(numpy.frombuffer(buffer, dtype=dtype,
+                                                count=count))
+            self._columns = columns
+        return self._columns
+
+    def record_array(self):
+        micros, codes = self._mapped()
+        return ChronRecordArray().set_columns(self._parent, micros, codes)
+
+    def __getitem__(self, index):
+        return self.record_array()[index]
+
+    def __iter__(self):
+        return iter(self.record_array())
+
+    def between(self, first, last):
+        # the records with first <= point < last, by binary search if the
+        # store is in time order, or else by a scan a chunk at a time
+        records = self.record_array()
+        micros = records.epoch_micros()
+        low, high = [convert_leap_seconds(
+            point._micros, point._parent._leap_seconds,
+            self._parent._leap_seconds) for point in (first, last)]
+        if self._header['sorted']:
+            start, stop = numpy.searchsorted(micros, [low, high]).tolist()
+            return records[start:stop]
+        rows = []
+        for start in range(0, len(micros), self._chunk_size):
+            chunk = micros[start:start + self._chunk_size]
+            rows.append(start + numpy.flatnonzero(
+                (chunk >= low) & (chunk < high)))
+        rows = numpy.concatenate(rows) if rows else numpy.zeros(0, int)
+        return ChronRecordArray().set_columns(
+            self._parent, micros[rows], records.zone_codes()[rows])
+
+
+def write_store_header(path, header):
+    temporary = os.path.join(path, STORE_HEADER + '.tmp')
+    with open(temporary, 'w') as fh:
+        json.dump(header, fh, indent=2, sort_keys=True)
+    os.replace(temporary, os.path.join(path, STORE_HEADER))
+
+
+def read_store_header(path):
+    try:
+        with open(os.path.join(path, STORE_HEADER)) as fh:
+            header = json.load(fh)
+    except (IOError, ValueError):
+        raise InvalidStoreError('no point store header in "%s"' % path)
+    if header.get('format') != STORE_FORMAT:
+        raise InvalidStoreError('"%s" is not a point store' % path)
+    return header
+
+
+class ChronRecurrence(object):
+
+    # Points at a fixed local time of day on every day that passes the
+    # day-of-week, day-of-month and month filters (None passes all).
+    # Occurrences are made one at a time, each resolved through the
+    # zone table with the rule's policy, so a schedule can run for
+    # years without building anything up front.
+
+    def set_rule(self, parent, hour, minute, second, fraction,
+                 days_of_week, days_of_month, months, policy):
+        check_policy(policy, RESOLVE_POINT_POLICIES)
+        check_time_of_day(hour, minute, second, fraction)
+        self._parent = parent
+        self._time_of_day = ((hour * 60 + minute) * 60 + second) * \
+            MICROS_PER_SECOND + fraction
+        self._days_of_week = None if days_of_week is None else \
+            frozenset(days_of_week)
+        self._days_of_month = None if days_of_month is None else \
+            frozenset(days_of_month)
+        self._months = None if months is None else frozenset(months)
+        self._policy = policy
+        return self
+
+    def _days(self, day):
+        # the matching day numbers from day onward; gives up after a
+        # full 400-year cycle of the calendar with no match
+        calendar = self._parent._calendar
+        give_up = day + 146097
+        while day < give_up:
+            year, month, day_of_month = calendar.civil_from_days(day)
+            if self._months is not None and month not in self._months:
+                day = calendar.days_from_civil(year + month // 12,
+                                               month % 12 + 1, 1)
+                continue
+            if (self._days_of_month is None or
+                    day_of_month in self._days_of_month) and \
+                    (self._days_of_week is None or
+                     day_of_week_from_days(day) in self._days_of_week):
+                give_up = day + 146097
+                yield day
+            day += 1
+
+    def _instants(self, micros):
+        # Start a day early, since resolving a skipped time can push the
+        # previous day's occurrence past micros.  The zone table works
+        # on 86400-second days, so convert to and from the line's own
+        # leap-second timescale.
+        line = self._parent
+        table = line._zone_table()
+        civil = line._to_civil_micros(micros)
+        day = (civil + table.utc_offset(civil)) // MICROS_PER_DAY - 1
+        for day in self._days(day):
+            instant = line._from_civil_micros(table.resolve(
+                day * MICROS_PER_DAY + self._time_of_day, self._policy))
+            if instant >= micros:
+                yield instant
+
+    def starting_at(self, point):
+        # every occurrence at or after point, in order, without end
+        for instant in self._instants(self._parent._micros_of(point)):
+            yield ChronPoint().set_micros(self._parent, instant)
+
+    def first_at_or_after(self, point):
+        for occurrence in self.starting_at(point):
+            return occurrence
+        return None
+
+    def between(self, first, last):
+        # the occurrences in the interval [first, last)
+        last = self._parent._micros_of(last)
+        for instant in self._instants(self._parent._micros_of(first)):
+            if instant >= last:
+                return
+            yield ChronPoint().set_micros(self._parent, instant)
+
+
+class ChronInterval(object):
+
+    # The half-open span of instants from first up to (but not including)
+    # last.  The two points may be on different lines.
+    __slots__ = ('_first', '_last')
+
+    def set_points(self, first, last):
+        if last.before(first):
+            raise InvalidIntervalError('interval ends before it starts')
+        self._first = first
+        self._last = last
+        return self
+
+    def first(self):
+        return self._first
+
+    def last(self):
+        return self._last
+
+    def contains(self, point):
+        return self._first.before_simultaneous(point) and \
+            point.before(self._last)
+
+    def overlaps(self, other):
+        return (self._first.before(other._last) and
+                other._first.before(self._last) and
+                self._first.before(self._last) and
+                other._first.before(other._last))
+
+
+class ChronIntervalSet(object):
+
+    # A static index over many intervals, held as int64 instants on the
+    # set's line.  The intervals are sorted by start and, if that takes
+    # few enough, dealt into layers so that within a layer the ends are
+    # sorted too.  Every query (overlap, containment, stabbing) then
+    # matches a contiguous run of each layer, found with two binary
+    # searches, so a query costs O(layers * log n + k).  There is one
+    # layer per level of nesting, which for typical bookings or
+    # schedules is a handful; deeply nested intervals (such as long
+    # contract windows) go in an _IntervalTree instead.  Queries return
+    # the matching positions in the order the set was loaded.
+
+    # the most layers worth searching one by one
+    LAYER_LIMIT = 8
+
+    def set_columns(self, parent, firsts, lasts):
+        firsts = numpy.array(firsts, dtype=numpy.int64)
+        lasts = numpy.array(lasts, dtype=numpy.int64)
+        if len(firsts) != len(lasts):
+            raise InvalidIntervalError('need as many lasts as firsts')
+        if (lasts < firsts).any():
+            raise InvalidIntervalError('interval ends before it starts')
+        for column in (firsts, lasts):
+            column.flags.writeable = False
+        self._parent = parent
+        self._firsts = firsts
+        self._lasts = lasts
+        self._layers = interval_layers(firsts, lasts, self.LAYER_LIMIT)
+        self._tree = None
+        if self._layers is None:
+            self._tree = _IntervalTree(firsts, lasts)
+        return self
+
+    def line(self):
+        return self._parent
+
+    def __len__(self):
+        return len(self._firsts)
+
+    def __getitem__(self, index):
+        return ChronInterval().set_points(
+            ChronPoint().set_micros(self._parent, int(self._firsts[index])),
+            ChronPoint().set_micros(self._parent, int(self._lasts[index])))
+
+    def __iter__(self):
+        for i in range(len(self._firsts)):
+            yield self[i]
+
+    def firsts(self):
+        return self._parent.point_array(self._firsts)
+
+    def lasts(self):
+        return self._parent.point_array(self._lasts)
+
+    def layer_count(self):
+        # None if there were too many layers to search them one by one
+        return None if self._layers is None else len(self._layers)
+
+    def _query(self, first_side, first_bound, last_side, last_bound):
+        # In each layer, the lasts from searchsorted(last_bound) onward
+        # and the firsts before searchsorted(first_bound) are a run.
+        if self._tree is not None:
+            return self._tree.reaching(first_side, first_bound,
+                                       last_side, last_bound)
+        found = []
+        for firsts, lasts, positions in self._layers:
+            start = numpy.searchsorted(lasts, last_bound, last_side)
+            stop = numpy.searchsorted(firsts, first_bound, first_side)
+            if start < stop:
+                found.append(positions[start:stop])
+        if not found:
+            return numpy.zeros(0, dtype=numpy.intp)
+        return numpy.sort(numpy.concatenate(found))
+
+    def _bounds(self, interval):
+        # the interval's ends on this set's timescale
+        return (self._parent._micros_of(interval._first),
+                self._parent._micros_of(interval._last))
+
+    def containing_point(self, point):
+        micros = self._parent._micros_of(point)
+        return self._query('right', micros, 'right', micros)
+
+    def overlapping(self, interval):
+        first, last = self._bounds(interval)
+        found = self._query('left', last, 'right', first)
+        if first == last:
+            return found[:0]
+        return found[self._firsts[found] < self._lasts[found]]
+
+    def containing(self, interval):
+        first, last = self._bounds(interval)
+        return self._query('right', first, 'left', last)
+
+    def within(self, interval):
+        # firsts at or after the interval's first, lasts at or before its
+        # last: the searches run the other way round
+        first, last = self._bounds(interval)
+        if self._tree is not None:
+            return self._tree.ending_by(first, last)
+        found = []
+        for firsts, lasts, positions in self._layers:
+            start = numpy.searchsorted(firsts, first, 'left')
+            stop = numpy.searchsorted(lasts, last, 'right')
+            if start < stop:
+                found.append(positions[start:stop])
+        if not found:
+            return numpy.zeros(0, dtype=numpy.intp)
+        return numpy.sort(numpy.concatenate(found))
+
+    # The set algebra returns new sets, on this set's line, of disjoint
+    # intervals in time order.  The other operand's ends are converted
+    # to this set's leap-second timescale once, up front.
+
+    def union(self, other):
+        return self._sweep(other, numpy.logical_or)
+
+    def intersection(self, other):
+        return self._sweep(other, numpy.logical_and)
+
+    def difference(self, other):
+        return self._sweep(other, lambda a, b: a & ~b)
+
+    def complement(self, bounds=None):
+        # everything within bounds (by default the whole line) not
+        # covered by this set
+        if bounds is None:
+            bounds = self._parent.negative_infinity().through(
+                self._parent.positive_infinity())
+        return self._parent.interval_set_of([bounds]).difference(self)
+
+    def _sweep(self, other, keep):
+        # Sort the endpoints of both sets once and sweep across them,
+        # counting how many intervals of each cover the gap after every
+        # endpoint.  Keep the gaps where keep(in self, in other) holds,
+        # skipping empty gaps between equal endpoints, and join runs of
+        # kept gaps into intervals.
+        ends = numpy.concatenate(
+            [self._firsts, self._lasts,
+             self._parent._micros_of_column(other.firsts()),
+             self._parent._micros_of_column(other.lasts())])
+        order = numpy.argsort(ends, kind='stable')
+        ends = ends[order]
+        covered = []
+        for before, operand, after in [(0, self, 2 * len(other)),
+                                       (2 * len(self), other, 0)]:
+            steps = numpy.concatenate([
+                numpy.zeros(before, dtype=numpy.int64),
+                numpy.ones(len(operand), dtype=numpy.int64),
+                -numpy.ones(len(operand), dtype=numpy.int64),
+                numpy.zeros(after, dtype=numpy.int64)])
+            covered.append(numpy.cumsum(steps[order])[:-1] > 0)
+        gaps = numpy.flatnonzero(ends[1:] != ends[:-1])
+        kept = keep(covered[0][gaps], covered[1][gaps])
+        padded = numpy.concatenate(([False], kept, [False]))
+        starts = numpy.flatnonzero(kept & ~padded[:-2])
+        stops = numpy.flatnonzero(kept & ~padded[2:])
+        return ChronIntervalSet().set_columns(
+            self._parent, ends[gaps[starts]], ends[gaps[stops] + 1])
+
+
+def interval_layers(firsts, lasts, limit=None):
+    # Deal the intervals, sorted by first and then last, into as few
+    # layers as possible with lasts non-decreasing in each, by patience
+    # sorting: each goes on the layer with the largest last that does
+    # not exceed its own.  The layers' tails are kept negated, largest
+    # last first, so a new layer is appended rather than inserted.
+    # Gives up, returning None, once it needs more than limit layers.
+    order = numpy.lexsort((lasts, firsts))
+    sorted_lasts = lasts[order]
+    if (sorted_lasts[1:] >= sorted_lasts[:-1]).all():
+        layer = numpy.zeros(len(order), dtype=numpy.intp)
+    else:
+        layer = numpy.empty(len(order), dtype=numpy.intp)
+        negated_tails = []
+        for i, last in enumerate(sorted_lasts.tolist()):
+            slot = bisect_left(negated_tails, -last)
+            if slot == len(negated_tails):
+                if limit is not None and slot == limit:
+                    return None
+                negated_tails.append(-last)
+            else:
+                negated_tails[slot] = -last
+            layer[i] = slot
+    layers = []
+    by_layer = order[numpy.argsort(layer, kind='stable')]
+    counts = numpy.bincount(layer) if len(layer) else []
+    start = 0
+    for count in counts:
+        positions = by_layer[start:start + count]
+        layers.append((firsts[positions], lasts[positions], positions))
+        start += count
+    return layers
+
+
+class _IntervalTree(object):
+
+    # The intervals sorted by first, with a segment tree over their
+    # lasts: level 0 holds the lasts themselves and each level above
+    # halves the number of runs, keeping each run's largest and smallest
+    # last.  A query takes a range of the sorted firsts (two binary
+    # searches) and walks down from the root a level at a time, as
+    # numpy operations on all the runs still in play, keeping those
+    # that overlap the range and could hold a last beyond the bound.
+    # Each kept run inside the range holds at least one answer and at
+    # most two per level straddle its ends, so a query visits
+    # O((k + 1) log n) runs, however deeply the intervals nest.
+
+    def __init__(self, firsts, lasts):
+        order = numpy.lexsort((lasts, firsts))
+        self.positions = order
+        self.firsts = firsts[order]
+        size = 1
+        while size < len(order):
+            size *= 2
+        largest = numpy.full(size, INT64_MIN, dtype=numpy.int64)
+        smallest = numpy.full(size, POSITIVE_INFINITY, dtype=numpy.int64)
+        largest[:len(order)] = smallest[:len(order)] = lasts[order]
+        self.largest = [largest]
+        self.smallest = [smallest]
+        while len(largest) > 1:
+            largest = largest.reshape(-1, 2).max(axis=1)
+            smallest = smallest.reshape(-1, 2).min(axis=1)
+            self.largest.append(largest)
+            self.smallest.append(smallest)
+
+    def _walk(self, start, stop, keep):
+        # the positions, in load order, of the intervals start <= i <
+        # stop (in first order) whose run passes keep(level, runs) at
+        # every level
+        runs = numpy.zeros(1, dtype=numpy.intp)
+        for level in range(len(self.largest) - 1, -1, -1):
+            width = 1 << level
+            runs = runs[(runs * width < stop) & ((runs + 1) * width > start)]
+            runs = runs[keep(level, runs)]
+            if level:
+                runs = (runs[:, None] * 2 + [0, 1]).ravel()
+        return numpy.sort(self.positions[runs])
+
+    def reaching(self, first_side, first_bound, last_side, last_bound):
+        # as ChronIntervalSet._query: firsts before first_bound (or at
+        # it, on the right side), lasts at or past last_bound (or past
+        # it, on the right side)
+        stop = numpy.searchsorted(self.firsts, first_bound, first_side)
+        inclusive = last_side == 'left'
+
+        def keep(level, runs):
+            largest = self.largest[level][runs]
+            return largest >= last_bound if inclusive else \
+                largest > last_bound
+        return self._walk(0, stop, keep)
+
+    def ending_by(self, first, last):
+        # firsts at or after first, lasts at or before last
+        start = numpy.searchsorted(self.firsts, first, 'left')
+        stop = numpy.searchsorted(self.firsts, last, 'right')
+        return self._walk(start, stop, lambda level, runs:
+                          self.smallest[level][runs] <= last)
 
 
 class ChronClock:
 
-    def __init__(self, line):
+    # Reads the system clock, which counts POSIX (collapsed) time.  With
+    # a tick (in microseconds), reads within the same tick share one
+    # cached point, stamped at the start of the tick, so a busy caller
+    # pays for a point only once per tick.
+
+    def __init__(self, line, tick=None):
+        if tick is not None and tick < 1:
+            raise InvalidOptionValueError('tick must be at least 1 micros')
         self._line = line
-        pass
+        self._tick = tick
+        self._cached = None
+        self._last_stamp = NEGATIVE_INFINITY
+        self._lock = Lock()
+
+    def _now_micros(self):
+        return time_ns() // 1000
+
+    def read_micros(self):
+        micros = self._now_micros()
+        if self._tick is not None:
+            micros -= micros % self._tick
+        return micros
 
     def read(self, line=None):
         if line is None:
             line = self._line
-        return line.xfrom()
+        micros = convert_leap_seconds(self.read_micros(),
+                                      COLLAPSE_LEAP_SECONDS,
+                                      line._leap_seconds)
+        cached = self._cached
+        if cached is not None and cached._micros == micros and \
+                cached._parent is line:
+            return cached
+        point = ChronPoint().set_micros(line, micros)
+        if self._tick is not None:
+            self._cached = point
+        return point
+
+    def read_many(self, count, line=None):
+        # count strictly increasing stamps, none earlier than the clock
+        # and all later than any stamp this clock has handed out before
+        if line is None:
+            line = self._line
+        with self._lock:
+            first = max(self._now_micros(), self._last_stamp + 1)
+            self._last_stamp = first + count - 1
+        return line.point_array(convert_leap_seconds_column(
+            numpy.arange(first, first + count, dtype=numpy.int64),
+            COLLAPSE_LEAP_SECONDS, line._leap_seconds))
+
+
+class ChronSimulatedClock(ChronClock):
+
+    # A clock whose time only moves when told to, for tests.  Deadlines
+    # may be scheduled with optional callbacks; run_next() jumps straight
+    # to the earliest one instead of waiting for it.
+
+    def __init__(self, line, start, tick=None):
+        ChronClock.__init__(self, line, tick)
+        self._now = self._posix_micros(start)
+        self._deadlines = []
+        self._scheduled = 0
+
+    def _now_micros(self):
+        return self._now
+
+    def _posix_micros(self, point):
+        # the clock keeps POSIX time, whatever the point's timescale
+        return convert_leap_seconds(point._micros, point._parent._leap_seconds,
+                                    COLLAPSE_LEAP_SECONDS)
+
+    def advance(self, micros):
+        if micros < 0:
+            raise InvalidOptionValueError('a clock cannot go backwards')
+        self._now += micros
+
+    def advance_to(self, point):
+        self.advance(self._posix_micros(point) - self._now)
+
+    def schedule(self, point, callback=None):
+        # deadlines that fall together run in the order scheduled
+        heappush(self._deadlines, (self._posix_micros(point),
+                                   self._scheduled, point, callback))
+        self._scheduled += 1
+
+    def next_deadline(self):
+        return self._deadlines[0][2] if self._deadlines else None
+
+    def run_next(self):
+        # Jump to the earliest deadline (never backwards), run its
+        # callback and return its point, or None if nothing is pending.
+        if not self._deadlines:
+            return None
+        micros, _, point, callback = heappop(self._deadlines)
+        self._now = max(self._now, micros)
+        if callback is not None:
+            callback(point)
+        return point
+
+    def run_until(self, point):
+        # run every deadline up to and including point, then stop there
+        micros = self._posix_micros(point)
+        while self._deadlines and self._deadlines[0][0] <= micros:
+            self.run_next()
+        self._now = max(self._now, micros)
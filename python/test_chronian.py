@@ -22,10 +22,31 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import mmap
+import os
+import random
+import shutil
+import tempfile
 import unittest
+from collections import OrderedDict
+from itertools import islice
+from unittest import mock
+from datetime import datetime, timedelta, timezone as datetime_timezone
+import numpy
+import chronian
 from chronian import \
-    Chron, ChronClock, InvalidOptionNameError, InvalidOptionValueError, \
-    MissingTimeZoneError
+    Chron, ChronClock, ChronPoint, ChronSimulatedClock, \
+    AmbiguousTimeError, InvalidOptionNameError, InvalidOptionValueError, \
+    NonExistentTimeError, InfinitePointError, InvalidFormatSpecError, \
+    InvalidIntervalError, InvalidShortIdError, InvalidStoreError, \
+    InvalidTimeZoneError, MissingShortIdError, MissingTimeZoneError, \
+    ParseError, FrozenSpecError, EPOCH, NEGATIVE_INFINITY, \
+    POSITIVE_INFINITY, LEAP_SECOND_DAYS, MICROS_PER_DAY, MICROS_PER_HOUR, \
+    MICROS_PER_SECOND, civil_from_days, convert_leap_seconds, \
+    julian_civil_from_days, julian_days_from_civil, \
+    convert_leap_seconds_column, days_from_civil, leap_table, \
+    micros_from_timedelta, read_leap_seconds
+from pytz import OLSON_VERSION, timezone, utc
 
 
 class ChronTest(unittest.TestCase):
@@ -98,6 +119,42 @@ class ChronLineTest(unittest.TestCase):
         self.assertEqual(expected,
                          self.chron_with_zone.line().name())
 
+    def testLineInterned(self):
+        line = self.chron.line({'time_zone_id': 'US/Central'})
+        self.assertIs(line, self.chron.line({'time_zone_id': 'US/Central'}))
+        self.assertIs(line, self.chron.line(
+            {'time_zone_id': 'US/Central',
+             'leap_seconds': 'UTC leap seconds'}))
+        self.assertIsNot(line, self.chron.line({'time_zone_id': 'UTC'}))
+
+    def testLineCacheCounters(self):
+        chron = Chron()
+        chron.line({'time_zone_id': 'UTC'})
+        chron.line({'time_zone_id': 'UTC'})
+        chron.line({'time_zone_id': 'US/Pacific'})
+        info = chron.line_cache_info()
+        self.assertEqual(1, info['hits'])
+        self.assertEqual(2, info['misses'])
+        self.assertEqual(2, info['size'])
+
+    def testLineCacheEviction(self):
+        chron = Chron(line_cache_size=2)
+        utc = chron.line({'time_zone_id': 'UTC'})
+        chron.line({'time_zone_id': 'US/Pacific'})
+        chron.line({'time_zone_id': 'UTC'})
+        chron.line({'time_zone_id': 'US/Eastern'})  # evicts US/Pacific
+        self.assertEqual(2, chron.line_cache_info()['size'])
+        self.assertIs(utc, chron.line({'time_zone_id': 'UTC'}))
+        chron.line({'time_zone_id': 'US/Pacific'})
+        self.assertEqual(4, chron.line_cache_info()['misses'])
+
+    def testLineCacheInvalidOptions(self):
+        self.assertRaises(InvalidTimeZoneError,
+                          self.chron.line, {'time_zone_id': 'Mars/Olympus'})
+        self.assertRaises(InvalidOptionNameError,
+                          self.chron.line, {'cat': 'dog'})
+        self.assertEqual(0, self.chron.line_cache_info()['size'])
+
 
 class ChronPointTest(unittest.TestCase):
 
@@ -140,11 +197,1516 @@ class ChronPointTest(unittest.TestCase):
         self.assertEqual('1969-07-20 16:18:00-04:00', p.to(ET).format())
         self.assertEqual('1969-07-20 13:18:00-07:00', p.to(PT).format())
 
+    def testPointHasNoDict(self):
+        p = self.line.point(1969, 7, 20, 20, 18)
+        self.assertFalse(hasattr(p, '__dict__'))
+        self.assertRaises(AttributeError, setattr, p, 'extra', 1)
+
+    def testPointFieldsSurviveConversion(self):
+        ET = Chron().line({'time_zone_id': 'America/New_York'})
+        p = ET.point(2016, 11, 6, 1, 30, 15, 250)  # ambiguous, picks EST
+        q = p.to(self.line).to(ET)
+        self.assertEqual((2016, 11, 6, 1, 30, 15, 250, Chron.SUN),
+                         (q.year(), q.month(), q.day_of_month(), q.hour(),
+                          q.minute(), q.second(), q.fraction(),
+                          q.day_of_week()))
+        self.assertEqual(6, p.to(self.line).hour())
+
+    def testPointInSkippedHour(self):
+        # like pytz localize(), 02:30 on a spring-forward day is read
+        # with the offset from before the gap
+        ET = Chron().line({'time_zone_id': 'America/New_York'})
+        p = ET.point(2016, 3, 13, 2, 30)
+        self.assertEqual(7, p.to(self.line).hour())
+        self.assertEqual(3, p.hour())
+
+    def testTemporalAndSortOrder(self):
+        ET = Chron().line({'time_zone_id': 'America/New_York'})
+        p = self.line.point(2016, 7, 4, 16)
+        q = ET.point(2016, 7, 4, 12)
+        r = self.line.point(2016, 7, 4, 17)
+        self.assertTrue(p.simultaneous(q))
+        self.assertTrue(p.before_simultaneous(q) and p.after_simultaneous(q))
+        self.assertFalse(p.before(q) or p.after(q))
+        self.assertTrue(q.before(r) and r.after(q))
+        self.assertEqual(p.temporal_key(), q.temporal_key())
+        self.assertNotEqual(0, p.sort_compare(q))
+        self.assertEqual(-p.sort_compare(q), q.sort_compare(p))
+        self.assertEqual(0, p.sort_compare(self.line.point(2016, 7, 4, 16)))
+        self.assertEqual(-1, q.sort_compare(r))
+        earlier = self.line.point(1901, 1, 1)
+        points = [r, q, earlier, p, self.line.negative_infinity()]
+        ordered = sorted(points, key=ChronPoint.sort_key)
+        self.assertEqual(['-infinity', '1901', '2016', '2016', '2016'],
+                         [x.format('%Y') for x in ordered])
+        self.assertIs(r, ordered[-1])
+        # worked out once, with the temporal key in its high bits
+        self.assertIs(r.sort_key(), r.sort_key())
+        self.assertEqual(NEGATIVE_INFINITY, ordered[0].temporal_key())
+
+    def testValueEqualityAndHash(self):
+        ET = Chron().line({'time_zone_id': 'America/New_York'})
+        p = self.line.point(2016, 7, 4, 16)
+        same = Chron().line({'time_zone_id': 'UTC'}).point(2016, 7, 4, 16)
+        simultaneous = ET.point(2016, 7, 4, 12)
+        self.assertEqual(p, same)
+        self.assertEqual(hash(p), hash(same))
+        self.assertNotEqual(p, simultaneous)
+        self.assertNotEqual(p, p._micros)
+        self.assertEqual(2, len({p, same, simultaneous}))
+        self.assertEqual(1, len({x.temporal_key()
+                                 for x in [p, same, simultaneous]}))
+
+    def testOrderAcrossLeapSecondTimescales(self):
+        leap = Chron().line({'time_zone_id': 'UTC',
+                             'leap_seconds': 'UTC leap seconds'})
+        p = self.line.point(2016, 7, 4, 12)
+        q = p.to(leap)
+        self.assertNotEqual(p._micros, q._micros)
+        self.assertTrue(p.simultaneous(q))
+        self.assertFalse(p.before(q) or p.after(q))
+        self.assertEqual(p.temporal_key(), q.temporal_key())
+        later = leap.point(2016, 7, 4, 12, 0, 1)
+        self.assertTrue(p.before(later) and later.after(p))
+        self.assertTrue(later.after_simultaneous(q))
+        self.assertEqual([p, later], sorted([later, p],
+                                            key=ChronPoint.sort_key))
+
+
+class CivilDaysTest(unittest.TestCase):
+
+    def testEpoch(self):
+        self.assertEqual((1970, 1, 1), civil_from_days(0))
+        self.assertEqual(0, days_from_civil(1970, 1, 1))
+
+    def testRoundTrip(self):
+        for days in range(-800000, 800000, 997):
+            self.assertEqual(days, days_from_civil(*civil_from_days(days)))
+
+    def testLeapDays(self):
+        self.assertEqual((2000, 2, 29),
+                         civil_from_days(days_from_civil(2000, 3, 1) - 1))
+        self.assertEqual((1900, 2, 28),
+                         civil_from_days(days_from_civil(1900, 3, 1) - 1))
+        self.assertEqual((1900, 2, 29), julian_civil_from_days(
+            julian_days_from_civil(1900, 3, 1) - 1))
+
+    def testJulian(self):
+        # the day the Gregorian calendar was first used
+        self.assertEqual(days_from_civil(1582, 10, 15),
+                         julian_days_from_civil(1582, 10, 5))
+        self.assertEqual((1969, 12, 19), julian_civil_from_days(0))
+        for days in range(-800000, 800000, 997):
+            self.assertEqual(
+                days, julian_days_from_civil(*julian_civil_from_days(days)))
+
+    def testJulianAgainstDayByDayCount(self):
+        lengths = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+        days = julian_days_from_civil(1500, 1, 1)
+        for year in range(1500, 1700):
+            for month in range(1, 13):
+                length = lengths[month - 1] + (month == 2 and year % 4 == 0)
+                for day in range(1, length + 1):
+                    self.assertEqual((year, month, day),
+                                     julian_civil_from_days(days))
+                    days += 1
+
+    def testColumnsMatchScalars(self):
+        days = numpy.arange(-800000, 800000, 997)
+        for from_days, to_days in [
+                (civil_from_days, days_from_civil),
+                (julian_civil_from_days, julian_days_from_civil)]:
+            columns = from_days(days)
+            self.assertEqual([from_days(d) for d in days.tolist()],
+                             list(zip(*[c.tolist() for c in columns])))
+            self.assertEqual(days.tolist(), to_days(*columns).tolist())
+
+    def testJulianLine(self):
+        line = Chron().line({'time_zone_id': 'UTC',
+                             'date_system': 'Proleptic Julian calendar'})
+        p = line.point(1969, 12, 19, 12)
+        self.assertEqual(12 * MICROS_PER_HOUR, p._micros)
+        self.assertEqual(Chron.THU, p.day_of_week())
+        self.assertEqual('1900-02-29 00:00:00+00:00',
+                         line.point(1900, 2, 29).format())
+        self.assertRaises(ValueError, Chron().line(
+            {'time_zone_id': 'UTC'}).point, 1900, 2, 29)
+        self.assertEqual(p, line.parse('1969-12-19T12:00:00Z'))
+        strings = ['1582-10-05T00:00:00', '1900-02-29 12:00:00']
+        array = line.parse_many(strings)
+        self.assertEqual([1582, 1900], array.year().tolist())
+        self.assertEqual([10, 2], array.month().tolist())
+        self.assertEqual([5, 29], array.day_of_month().tolist())
+        self.assertEqual('1582-10-15', array[0].to(Chron().line(
+            {'time_zone_id': 'UTC'})).format('%Y-%m-%d'))
+
+
+class ZoneTableTest(unittest.TestCase):
+
+    ZONES = ['UTC', 'America/New_York', 'Europe/London', 'Europe/Moscow',
+             'Australia/Lord_Howe', 'Asia/Kolkata', 'Etc/GMT+5']
+
+    def setUp(self):
+        self.chron = Chron()
+        self.rng = random.Random(1883)
+
+    def nearTransitions(self, line):
+        micros = []
+        for transition in line._zone_table().transitions[1:].tolist():
+            micros += [transition + self.rng.randrange(-3, 3) * 3600000000 +
+                       self.rng.randrange(0, 3600000000, 60000000)
+                       for i in range(3)]
+        return micros or [0]
+
+    def testUtcOffsetMatchesPytz(self):
+        for tzid in self.ZONES:
+            line = self.chron.line({'time_zone_id': tzid})
+            table = line._zone_table()
+            for micros in self.nearTransitions(line):
+                utc = EPOCH + timedelta(microseconds=micros)
+                expected = line.time_zone().fromutc(utc).utcoffset()
+                self.assertEqual(micros_from_timedelta(expected),
+                                 table.utc_offset(micros))
+
+    def testUtcMicrosMatchesPytzLocalize(self):
+        # includes wall-clock times that are skipped or repeated
+        for tzid in self.ZONES:
+            line = self.chron.line({'time_zone_id': tzid})
+            table = line._zone_table()
+            for local in self.nearTransitions(line):
+                wall = EPOCH + timedelta(microseconds=local)
+                expected = line.time_zone().localize(wall)
+                self.assertEqual(
+                    micros_from_timedelta(
+                        wall - expected.utcoffset() - EPOCH),
+                    table.utc_micros(local), '%s %s' % (tzid, wall))
+
+    def testUtcMicrosColumnMatchesScalar(self):
+        for tzid in self.ZONES:
+            line = self.chron.line({'time_zone_id': tzid})
+            table = line._zone_table()
+            local = self.nearTransitions(line)
+            self.assertEqual([table.utc_micros(m) for m in local],
+                             table.utc_micros_column(local).tolist())
+
+
+class ChronPointArrayTest(unittest.TestCase):
+
+    ZONES = ['UTC', 'America/New_York', 'Europe/London',
+             'Australia/Lord_Howe', 'Asia/Kolkata', 'Etc/GMT+5']
+
+    def setUp(self):
+        self.chron = Chron()
+        rng = random.Random(1957)
+        # 1800 to 2100, with a few instants right at the epoch
+        self.micros = [rng.randrange(-5364662400, 4102444800) * 1000000 +
+                       rng.randrange(1000000) for i in range(2000)]
+        self.micros += [-1, 0, 1]
+
+    def testFieldsMatchPoints(self):
+        for tzid in self.ZONES:
+            line = self.chron.line({'time_zone_id': tzid})
+            array = line.point_array(self.micros)
+            fields = [array.year(), array.month(), array.day_of_month(),
+                      array.hour(), array.minute(), array.second(),
+                      array.fraction(), array.day_of_week()]
+            for i, p in enumerate(array):
+                self.assertEqual(
+                    [p.year(), p.month(), p.day_of_month(), p.hour(),
+                     p.minute(), p.second(), p.fraction(), p.day_of_week()],
+                    [int(column[i]) for column in fields],
+                    '%s at %d' % (tzid, self.micros[i]))
+
+    def testArrayOfPoints(self):
+        line = self.chron.line({'time_zone_id': 'UTC'})
+        points = [line.point(1969, 7, 20, 20, 18), line.point(1957, 1, 3)]
+        array = line.point_array_of(points)
+        self.assertEqual(2, len(array))
+        self.assertEqual([1969, 1957], array.year().tolist())
+        self.assertEqual([Chron.SUN, Chron.THU], array.day_of_week().tolist())
+        self.assertEqual('1957-01-03 00:00:00+00:00', array[1].format())
+        self.assertEqual([1957], array[1:].year().tolist())
+
+    def testToMatchesPointTo(self):
+        # instants within a few hours of every transition of each zone
+        rng = random.Random(2016)
+        lines = [self.chron.line({'time_zone_id': tzid})
+                 for tzid in self.ZONES]
+        micros = []
+        for line in lines:
+            for transition in line._zone_table().transitions[1:].tolist():
+                micros += [transition + rng.randrange(-4, 4) * 3600000000 +
+                           rng.randrange(3600000000) for i in range(3)]
+        for source in lines:
+            array = source.point_array(micros)
+            for target in lines:
+                converted = array.to(target)
+                self.assertIs(target, converted.line())
+                fields = [converted.year(), converted.month(),
+                          converted.day_of_month(), converted.hour(),
+                          converted.minute(), converted.second(),
+                          converted.fraction(), converted.day_of_week()]
+                for i, p in enumerate(array):
+                    q = p.to(target)
+                    self.assertEqual(
+                        [q.year(), q.month(), q.day_of_month(), q.hour(),
+                         q.minute(), q.second(), q.fraction(),
+                         q.day_of_week()],
+                        [int(column[i]) for column in fields])
+                    self.assertEqual(q.format(), converted[i].format())
+
+    def testInfinitePoints(self):
+        line = self.chron.line({'time_zone_id': 'America/New_York'})
+        array = line.point_array([0, POSITIVE_INFINITY, NEGATIVE_INFINITY])
+        self.assertEqual(''.join([p.format() + '\n' for p in array]),
+                         array.format_many())
+        self.assertEqual('x;infinity;-infinity;', array.format_many('x', ';'))
+        self.assertEqual('infinity\n', array[1:2].format_many('%Y'))
+        for field in ['year', 'month', 'day_of_month', 'hour', 'minute',
+                      'second', 'fraction', 'day_of_week']:
+            self.assertRaises(InfinitePointError, getattr(array, field))
+            self.assertEqual([getattr(array[0], field)()],
+                             getattr(array[:1], field)().tolist())
+        values = array.to_datetime64()
+        self.assertEqual(numpy.datetime64(0, 'us'), values[0])
+        self.assertTrue(numpy.isnat(values[1:]).all())
+        self.assertFalse(values.flags.writeable)
+        # interval set bounds are often infinite
+        bounds = line.interval_set_of([]).complement()
+        self.assertEqual('-infinity\n', bounds.firsts().format_many())
+
+    def testArrayIsReadOnly(self):
+        line = self.chron.line({'time_zone_id': 'UTC'})
+        array = line.point_array([0, 1])
+        self.assertRaises(ValueError, array.epoch_micros().__setitem__, 0, 5)
+        self.assertRaises(ValueError, array.year().__setitem__, 0, 5)
+
+    def testDatetime64SharesBuffer(self):
+        line = self.chron.line({'time_zone_id': 'America/New_York'})
+        values = numpy.array(self.micros, dtype='datetime64[us]')
+        array = line.points_from_datetime64(values)
+        self.assertTrue(numpy.shares_memory(values, array.epoch_micros()))
+        self.assertEqual(self.micros, array.epoch_micros().tolist())
+        back = array.to_datetime64()
+        self.assertEqual(numpy.dtype('datetime64[us]'), back.dtype)
+        self.assertTrue(numpy.shares_memory(values, back))
+        self.assertFalse(back.flags.writeable)
+        seconds = values.astype('datetime64[s]')
+        self.assertEqual(seconds.astype('datetime64[us]').tolist(),
+                         line.points_from_datetime64(seconds)
+                         .to_datetime64().tolist())
+        nat = line.points_from_datetime64(
+            numpy.array(['NaT', '2016-07-04'], dtype='datetime64[ms]'))
+        self.assertEqual(-2 ** 63, nat.epoch_micros()[0])
+        self.assertTrue(numpy.isnat(nat.to_datetime64()[0]))
+        self.assertRaises(InvalidOptionValueError,
+                          line.points_from_datetime64, self.micros)
+
+    def testDatetime64OnUtcLeapLine(self):
+        line = self.chron.line({'time_zone_id': 'UTC',
+                                'leap_seconds': 'UTC leap seconds'})
+        values = numpy.array(['2017-01-01T00:00:00'], dtype='datetime64[us]')
+        array = line.points_from_datetime64(values)
+        self.assertEqual('2017-01-01 00:00:00+00:00', array[0].format())
+        self.assertEqual(values.tolist(), array.to_datetime64().tolist())
+
+    def testFromDatetimes(self):
+        zones = [timezone('America/New_York'), timezone('Asia/Kolkata')]
+        epoch = EPOCH.replace(tzinfo=utc)
+        datetimes = []
+        for i, micros in enumerate(self.micros):
+            instant = epoch + timedelta(microseconds=micros)
+            if i % 3 == 0:
+                datetimes.append(instant)
+            elif i % 3 == 1:
+                datetimes.append(instant.astimezone(zones[i % 2]))
+            else:
+                datetimes.append(instant.astimezone(
+                    datetime_timezone(timedelta(hours=i % 24 - 12))))
+        line = self.chron.line({'time_zone_id': 'UTC'})
+        self.assertEqual(self.micros,
+                         line.from_datetimes(datetimes).epoch_micros()
+                         .tolist())
+        self.assertRaises(MissingTimeZoneError, line.from_datetimes,
+                          [EPOCH])
+
+
+class ParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.line = Chron().line({'time_zone_id': 'America/New_York'})
+
+    def testParseLocal(self):
+        p = self.line.parse('2016-07-04T09:30:00')
+        self.assertEqual('2016-07-04 09:30:00-04:00', p.format())
+
+    def testParseWithOffset(self):
+        p = self.line.parse('2016-07-04T09:30:00.25+05:30')
+        self.assertEqual('2016-07-04 00:00:00.250000-04:00', p.format())
+        p = self.line.parse('20160704T1330Z')
+        self.assertEqual('2016-07-04 09:30:00-04:00', p.format())
+
+    def testParseDateOnly(self):
+        self.assertEqual(0, self.line.parse('2016-07-04').hour())
+
+    def testParseErrors(self):
+        for string in ['', 'yesterday', '2016-02-30T00:00:00',
+                       '2016-07-04T24:00:00', '2016-07-04T09:30:00+5']:
+            self.assertRaises(ParseError, self.line.parse, string)
+            self.assertRaises(ParseError, self.line.parse_many, [string])
+
+    def testParseManyMatchesParse(self):
+        strings = [
+            '2016-07-04T09:30:00',
+            '2016-11-06T01:30:00',  # repeated hour
+            '2016-03-13 02:30:00',  # skipped hour
+            '2016-07-04T09:30:00.123',
+            '2016-07-04T09:30:00.123456',
+            '2016-07-04T09:30:00Z',
+            '2016-07-04T09:30:00.123Z',
+            '2016-07-04T09:30:00.123456Z',
+            '2016-07-04T09:30:00-07:00',
+            '2016-07-04T09:30:00.123+01:00',
+            '2016-07-04T09:30:00.123456+13:45',
+            '2016-07-04T09:30:00.1234567',  # general parser from here on
+            '2016-07-04t09:30',
+            '20160704T093000Z',
+            ' 2016-07-04 ',
+            ]
+        array = self.line.parse_many(iter(strings * 3))
+        self.assertEqual([self.line.parse(s).format() for s in strings * 3],
+                         [p.format() for p in array])
+        self.assertEqual(
+            [p.format() for p in array[:3]],
+            [p.format() for p in self.line.parse_many(
+                [s.encode('ascii') for s in strings[:3]])])
+
+    def testParseManyEmpty(self):
+        self.assertEqual(0, len(self.line.parse_many([])))
+
+
+class FormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chron = Chron()
+        self.line = self.chron.line({'time_zone_id': 'America/New_York'})
+        self.points = self.line.point_array(
+            [(1478412000 + i * 1800) * 1000000 + i * 7 for i in range(8)])
+
+    def testFormatSpec(self):
+        p = self.line.point(2016, 11, 6, 1, 30, 15, 250)
+        self.assertEqual('Sun 06 Nov 2016 01:30:15.000250 EST -0500 100%',
+                         p.format('%a %d %b %Y %H:%M:%S.%f %Z %z 100%%'))
+        self.assertEqual('Sunday, November 6', p.format('%A, %B 6'))
+
+    def testFormatSpecErrors(self):
+        p = self.line.point(2016, 11, 6)
+        for spec in ['%Q', 'x%', '%:']:
+            self.assertRaises(InvalidFormatSpecError, p.format, spec)
+
+    def testFormatterIsCached(self):
+        formatter = self.chron.formatter('%Y')
+        self.assertIs(formatter, self.chron.formatter('%Y'))
+        self.assertEqual('%Y', formatter.spec())
+
+    def testFormatManyMatchesFormat(self):
+        for spec in [None, '%Y-%m-%dT%H:%M:%S.%f%:z', '%a %b %d %H%M %z',
+                     '%A %Z', '100%% %Y']:
+            self.assertEqual(
+                ''.join([p.format(spec) + '\n' for p in self.points]),
+                self.points.format_many(spec), spec)
+        self.assertEqual(
+            ''.join([p.format('%H:%M') + ', ' for p in self.points]),
+            self.points.format_many('%H:%M', ', '))
+
+    def testFormatManyEmpty(self):
+        self.assertEqual('', self.points[:0].format_many('%Y'))
+
+
+class RecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chron = Chron()
+        self.ny = self.chron.line({'time_zone_id': 'America/New_York'})
+        self.utc = self.chron.line({'time_zone_id': 'Etc/UTC'})
+
+    def testShortId(self):
+        self.assertEqual('NYC', self.ny.short_id())
+        self.assertEqual('NYC', self.chron.line(
+            {'time_zone_id': 'US/Eastern'}).short_id())
+        self.assertEqual('Z', self.utc.short_id())
+        self.assertEqual('Z', self.chron.line(
+            {'time_zone_id': 'UTC'}).short_id())
+
+    def testPointRoundTrip(self):
+        p = self.ny.point(2016, 11, 6, 1, 30, 15, 250)
+        data = p.to_bytes()
+        self.assertEqual(12, len(data))
+        self.assertEqual(b'NYC\0', data[8:])
+        q = self.chron.record_array(data)[0]
+        self.assertIs(self.ny, q._parent)
+        self.assertEqual(p.format(), q.format())
+
+    def testArrayRoundTrip(self):
+        points = self.ny.point_array([-1, 0, 1478412000000000])
+        records = self.chron.record_array(memoryview(points.to_bytes()))
+        self.assertEqual(3, len(records))
+        self.assertEqual(points.epoch_micros().tolist(),
+                         records.epoch_micros().tolist())
+        array = records.point_array()
+        self.assertIs(self.ny, array.line())
+        self.assertEqual(points.format_many(), array.format_many())
+        self.assertEqual(points.to_bytes(), records.to_bytes())
+
+    def testOtherLeapSecondTimescales(self):
+        for scale in ['smear leap seconds', 'UTC leap seconds']:
+            line = self.chron.line({'time_zone_id': 'America/New_York',
+                                    'leap_seconds': scale})
+            p = line.point(2016, 7, 4, 12)
+            q = self.chron.record_array(p.to_bytes())[0]
+            self.assertEqual('2016-07-04 12:00:00-04:00', q.format())
+            self.assertTrue(p.simultaneous(q))
+            chron = Chron({'leap_seconds': scale})
+            records = self.ny.point_array([p.to(self.ny)._micros]) \
+                .record_array(chron)
+            self.assertEqual([p._micros], records.epoch_micros().tolist())
+            self.assertEqual(p, records[0])
+
+    def testOtherDateSystem(self):
+        julian = {'date_system': 'Proleptic Julian calendar'}
+        line = self.chron.line(dict(julian, time_zone_id='America/New_York'))
+        p = line.point(2016, 7, 4, 12)
+        self.assertRaises(InvalidOptionValueError, p.to_bytes)
+        self.assertRaises(InvalidOptionValueError,
+                          self.ny.point_array([0]).record_array,
+                          Chron(julian))
+        chron = Chron(julian)
+        p = chron.line({'time_zone_id': 'America/New_York'}).point(
+            2016, 7, 4, 12)
+        self.assertEqual('2016-07-04 12:00:00-04:00',
+                         chron.record_array(p.to_bytes())[0].format())
+
+    def testAliasRoundTrip(self):
+        eastern = self.chron.line({'time_zone_id': 'US/Eastern'})
+        p = eastern.point(2016, 7, 4, 12)
+        q = self.chron.record_array(p.to_bytes())[0]
+        self.assertIs(self.ny, q._parent)
+        self.assertEqual(p, q)
+        self.assertEqual(hash(p), hash(q))
+        self.assertEqual(0, p.sort_compare(q))
+        self.assertNotEqual(p, p.to(self.utc))
+        # GB-Eire shares a short id with Europe/Dublin but not its rules
+        eire = self.chron.line({'time_zone_id': 'GB-Eire'})
+        dublin = self.chron.line({'time_zone_id': 'Europe/Dublin'})
+        p = eire.point(1970, 7, 4, 12)
+        q = p.to(dublin)
+        self.assertNotEqual(p, q)
+        self.assertNotEqual(0, p.sort_compare(q))
+        self.assertEqual(2, len({p, q}))
+
+    def testLinesWithoutShortIds(self):
+        # outside the source tree there may be no short id table; lines
+        # still work, only records need it
+        missing = os.path.join(os.path.dirname(chronian.SHORT_IDS_PATH),
+                               'no_such_file.csv')
+        with mock.patch.object(chronian, 'SHORT_IDS_PATH', missing), \
+                mock.patch.object(chronian, '_short_ids', None):
+            eastern = Chron().line({'time_zone_id': 'US/Eastern'})
+            p = eastern.point(2016, 7, 4, 12)
+            self.assertEqual('2016-07-04 12:00:00-04:00', p.format())
+            self.assertEqual(p, eastern.point(2016, 7, 4, 12))
+            self.assertRaises(OSError, p.to_bytes)
+
+    def testMixedZones(self):
+        data = b''.join([self.ny.point(2016, 7, 4).to_bytes(),
+                         self.utc.point(2016, 7, 4).to_bytes(),
+                         self.ny.point(2016, 7, 5).to_bytes()])
+        records = self.chron.record_array(data)
+        self.assertEqual(['2016-07-04 00:00:00-04:00',
+                          '2016-07-04 00:00:00+00:00',
+                          '2016-07-05 00:00:00-04:00'],
+                         [p.format() for p in records])
+        self.assertRaises(InvalidShortIdError, records.point_array)
+        self.assertEqual(
+            '2016-07-04 04:00:00+00:00',
+            records.point_array(self.utc)[0].format())
+        arrays = records.point_arrays()
+        self.assertEqual([4, 5], arrays[self.ny].day_of_month().tolist())
+        self.assertEqual([4], arrays[self.utc].day_of_month().tolist())
+        self.assertEqual(2, len(records[1:]))
+
+    def testSortMixedZones(self):
+        rng = random.Random(15)
+        micros = [rng.randrange(4) * MICROS_PER_HOUR for i in range(200)]
+        lines = [rng.choice([self.ny, self.utc]) for i in range(200)]
+        data = b''.join(line.point_array([m]).to_bytes()
+                        for line, m in zip(lines, micros))
+        records = self.chron.record_array(data)
+        expected = sorted(records, key=ChronPoint.sort_key)
+        self.assertEqual([p.sort_key() for p in expected],
+                         [p.sort_key() for p in records.sorted()])
+        array = self.ny.point_array(micros)
+        self.assertEqual(sorted(micros),
+                         array.sorted().epoch_micros().tolist())
+        order = array.sort_order()
+        self.assertEqual(sorted(range(200), key=lambda i: (micros[i], i)),
+                         order.tolist())
+
+    def testDedupe(self):
+        rng = random.Random(16)
+        micros = [rng.randrange(6) * MICROS_PER_HOUR for i in range(200)]
+        lines = [rng.choice([self.ny, self.utc]) for i in range(200)]
+        data = b''.join(line.point_array([m]).to_bytes()
+                        for line, m in zip(lines, micros))
+        records = self.chron.record_array(data)
+        expected = list(OrderedDict.fromkeys(records))
+        deduped = list(records.dedupe())
+        self.assertEqual(expected, deduped)
+        self.assertEqual([p._parent for p in expected],
+                         [p._parent for p in deduped])
+        array = self.ny.point_array(micros)
+        self.assertEqual(list(OrderedDict.fromkeys(micros)),
+                         array.dedupe().epoch_micros().tolist())
+        self.assertEqual(sorted(set(micros)),
+                         array.unique().epoch_micros().tolist())
+        increasing = self.ny.point_array([1, 2, 3])
+        self.assertEqual([1, 2, 3],
+                         increasing.dedupe().epoch_micros().tolist())
+
+    def testBadShortIds(self):
+        data = b'\0' * 8 + b'XXXX'
+        self.assertRaises(InvalidShortIdError,
+                          self.chron.record_array(data).__getitem__, 0)
+        kyiv = self.chron.line({'time_zone_id': 'Europe/Kyiv'})
+        self.assertRaises(MissingShortIdError, kyiv.point(2016).to_bytes)
+
+
+class PointStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'store')
+        self.chron = Chron()
+        self.ny = self.chron.line({'time_zone_id': 'America/New_York'})
+        self.utc = self.chron.line({'time_zone_id': 'Etc/UTC'})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testAppendAndReopen(self):
+        store = self.chron.create_store(self.path, chunk_size=4)
+        store.append(self.ny.point_array(range(0, 30000000, 1000000)))
+        store.append(self.utc.point(2016, 7, 4))
+        store.append(self.ny.point_array([]))
+        self.assertEqual(31, len(store))
+        store.flush()
+        store = self.chron.open_store(self.path)
+        self.assertEqual(31, len(store))
+        self.assertTrue(store.is_sorted())
+        self.assertEqual(OLSON_VERSION, store.tzdata_version())
+        self.assertEqual('1969-12-31 19:00:29-05:00', store[29].format())
+        self.assertEqual('2016-07-04 00:00:00+00:00', store[30].format())
+        self.assertEqual(list(range(0, 30000000, 1000000)),
+                         store[:30].epoch_micros().tolist())
+        self.assertEqual([19] * 30,
+                         store[:30].point_array().hour().tolist())
+
+    def testViewsAreNotCopies(self):
+        with self.chron.create_store(self.path) as store:
+            store.append(self.ny.point_array(range(100)))
+        store = self.chron.open_store(self.path)
+        micros = store[10:20].epoch_micros()
+        base = micros.base
+        while not isinstance(base, memoryview):
+            base = base.base
+        self.assertIsInstance(base.obj, mmap.mmap)
+        self.assertFalse(micros.flags.writeable)
+
+    def testBetween(self):
+        store = self.chron.create_store(self.path, chunk_size=8)
+        store.append(self.ny.point_array(range(0, 100, 10)))
+        first = self.ny.point_array([25])[0]
+        last = self.ny.point_array([65])[0]
+        self.assertEqual([30, 40, 50, 60],
+                         store.between(first, last).epoch_micros().tolist())
+        store.append(self.ny.point_array([35, 5]))
+        self.assertFalse(store.is_sorted())
+        self.assertEqual([30, 40, 50, 60, 35],
+                         store.between(first, last).epoch_micros().tolist())
+
+    def testBetweenOnOtherTimescale(self):
+        base = self.utc.point(2016, 7, 4)._micros
+        store = self.chron.create_store(self.path)
+        store.append(self.utc.point_array(range(base, base + 100, 10)))
+        leap = self.chron.line({'time_zone_id': 'UTC',
+                                'leap_seconds': 'UTC leap seconds'})
+        first = self.utc.point_array([base + 25])[0].to(leap)
+        last = self.utc.point_array([base + 65])[0].to(leap)
+        self.assertEqual([30, 40, 50, 60], (store.between(
+            first, last).epoch_micros() - base).tolist())
+
+    def testAppendOtherTimescale(self):
+        store = self.chron.create_store(self.path)
+        leap = Chron({'leap_seconds': 'UTC leap seconds'})
+        line = leap.line({'time_zone_id': 'America/New_York'})
+        p = line.point(2016, 7, 4, 12)
+        store.append(p)
+        store.append(leap.record_array(p.to_bytes()))
+        self.assertEqual(['2016-07-04 12:00:00-04:00'] * 2,
+                         [q.format() for q in store])
+        julian = Chron({'date_system': 'Proleptic Julian calendar'})
+        self.assertRaises(InvalidOptionValueError, store.append, julian.line(
+            {'time_zone_id': 'America/New_York'}).point(2016, 7, 4, 12))
+        self.assertRaises(InvalidOptionValueError, store.append,
+                          julian.record_array(p.to_bytes()))
+
+    def testOpenErrors(self):
+        self.assertRaises(InvalidStoreError,
+                          self.chron.open_store, self.path)
+        self.chron.create_store(self.path)
+        self.assertRaises(
+            InvalidStoreError,
+            Chron({'leap_seconds': 'UTC leap seconds'}).open_store,
+            self.path)
+
+
+class LeapSecondTest(unittest.TestCase):
+
+    SCALES = ['collapse leap seconds', 'smear leap seconds',
+              'UTC leap seconds']
+
+    def setUp(self):
+        chron = Chron()
+        self.collapse, self.smear, self.utc = [
+            chron.line({'time_zone_id': 'UTC', 'leap_seconds': scale})
+            for scale in self.SCALES]
+
+    def nearLeaps(self):
+        # UTC micros within a day of every leap second, at least one of
+        # them inside each leap second
+        table = leap_table()
+        rng = random.Random(1972)
+        micros = []
+        for start in table.starts:
+            micros.append(start)
+            micros.append(start + rng.randrange(MICROS_PER_SECOND))
+            micros.extend(start + rng.randrange(-MICROS_PER_DAY,
+                                                MICROS_PER_DAY)
+                          for i in range(50))
+        return micros
+
+    def testBundledTableMatchesTzdata(self):
+        path = '/usr/share/zoneinfo/leap-seconds.list'
+        if not os.path.exists(path):
+            self.skipTest('no tzdata leap-seconds.list here')
+        self.assertEqual(LEAP_SECOND_DAYS[:len(read_leap_seconds(path))],
+                         read_leap_seconds(path))
+
+    def testEveryLeapSecond(self):
+        for k, day in enumerate(LEAP_SECOND_DAYS):
+            year, month, day_of_month = civil_from_days(
+                days_from_civil(*day) - 1)
+            leap = self.utc.point(year, month, day_of_month, 23, 59, 60, 5)
+            self.assertEqual('%04d-%02d-%02d 23:59:60.000005+00:00' % (
+                year, month, day_of_month), leap.format())
+            before = self.utc.point(year, month, day_of_month, 23, 59, 59)
+            after = self.utc.point(*day)
+            self.assertEqual(2 * MICROS_PER_SECOND,
+                             after._micros - before._micros)
+            self.assertEqual((k + 1) * MICROS_PER_SECOND,
+                             after._micros - self.collapse.point(*day)._micros)
+            self.assertEqual(self.collapse.point(*day), leap.to(self.collapse))
+            self.assertEqual(before, before.to(self.collapse).to(self.utc))
+            # halfway through the smear the smeared clock reads midnight
+            middle = self.utc.point(year, month, day_of_month, 23, 59, 60,
+                                    500000)
+            self.assertEqual('00:00:00.000000',
+                             middle.to(self.smear).format('%H:%M:%S.%f'))
+            self.assertRaises(ValueError, self.utc.point, year, month,
+                              day_of_month, 23, 58, 60)
+
+    def testColumnsMatchScalars(self):
+        utc = numpy.array(self.nearLeaps(), dtype=numpy.int64)
+        for source in self.SCALES:
+            micros = convert_leap_seconds_column(
+                utc, 'UTC leap seconds', source)
+            for target in self.SCALES:
+                self.assertEqual(
+                    [convert_leap_seconds(m, source, target)
+                     for m in micros.tolist()],
+                    convert_leap_seconds_column(
+                        micros, source, target).tolist())
+            self.assertEqual(micros.tolist(), convert_leap_seconds_column(
+                convert_leap_seconds_column(micros, source,
+                                            'UTC leap seconds'),
+                'UTC leap seconds', source).tolist())
+        array = self.utc.point_array(utc)
+        self.assertEqual([p.format() for p in array], array.format_many(
+            terminator='|').split('|')[:-1])
+        self.assertEqual(array.to(self.smear).epoch_micros().tolist(),
+                         [p.to(self.smear)._micros for p in array])
+
+    def testInfinitePointsStayInfinite(self):
+        for point in [self.utc.positive_infinity(),
+                      self.utc.negative_infinity()]:
+            self.assertTrue(point.to(self.smear).is_infinite())
+            self.assertEqual(point._micros,
+                             self.utc.point_array([point._micros]).to(
+                                 self.collapse).epoch_micros()[0])
+
+
+class DurationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chron = Chron()
+        self.ny = self.chron.line({'time_zone_id': 'America/New_York'})
+
+    def testMonthEndClamping(self):
+        month = self.chron.months(1)
+        p = self.ny.point(2016, 1, 31, 9)
+        self.assertEqual('2016-02-29 09:00:00-05:00', p.plus(month).format())
+        self.assertEqual('2016-03-31 09:00:00-04:00',
+                         p.plus(month.months(2)).format())
+        self.assertEqual('2015-02-28 09:00:00-05:00',
+                         p.minus(self.chron.duration_spec(
+                             years=1, months=-1)).format())
+
+    def testWallClockVersusElapsed(self):
+        p = self.ny.point(2016, 3, 12, 9)
+        self.assertEqual('2016-03-13 09:00:00-04:00',
+                         p.plus(self.chron.days(1)).format())
+        self.assertEqual('2016-03-13 10:00:00-04:00',
+                         p.plus(self.chron.hours(24)).format())
+        self.assertEqual('2016-03-19 09:00:30.000005-04:00', p.plus(
+            self.chron.weeks(1).seconds(30).fractions(5)).format())
+        skipped = self.ny.point(2016, 3, 12, 2, 30)
+        day = self.chron.days(1)
+        self.assertEqual('03:30', skipped.plus(day).format('%H:%M'))
+        self.assertEqual('01:30', skipped.plus(day, 'later').format('%H:%M'))
+        self.assertRaises(NonExistentTimeError, skipped.plus, day, 'raise')
+
+    def testArraysMatchPoints(self):
+        rng = random.Random(19)
+        micros = [rng.randrange(-2 * 10 ** 15, 2 * 10 ** 15)
+                  for i in range(500)]
+        # a month before a skipped time, so 'raise' has something to raise
+        gap = self.ny.point(2016, 2, 13, 2, 30)._micros
+        array = self.ny.point_array(micros + [POSITIVE_INFINITY, gap])
+        for duration in [self.chron.months(1), self.chron.days(30),
+                         self.chron.duration_spec(1, -13, 1, 1, 1, 1, 1, 1)]:
+            for policy in ['earlier', 'later', 'shift forward', 'raise']:
+                try:
+                    expected = [p.plus(duration, policy)._micros
+                                for p in array]
+                except (AmbiguousTimeError, NonExistentTimeError):
+                    self.assertRaises(
+                        (AmbiguousTimeError, NonExistentTimeError),
+                        array.plus, duration, policy)
+                    continue
+                self.assertEqual(expected, array.plus(
+                    duration, policy).epoch_micros().tolist())
+            # a duration has to land on a point, so 'NaT' is no policy
+            # for plus and minus
+            for policy in ['NaT', 'bogus']:
+                self.assertRaises(InvalidOptionValueError, array[0].plus,
+                                  duration, policy)
+                self.assertRaises(InvalidOptionValueError, array[-2].minus,
+                                  duration, policy)
+                self.assertRaises(InvalidOptionValueError, array.plus,
+                                  duration, policy)
+                self.assertRaises(InvalidOptionValueError, array.minus,
+                                  duration, policy)
+        hours = self.chron.hours(5)
+        self.assertEqual(array.epoch_micros().tolist(), array.plus(
+            hours).minus(hours).epoch_micros().tolist())
+
+    def testNaTPolicyRejected(self):
+        # a month on lands in the gap, which 'NaT' would leave as no time
+        p = self.ny.point(2016, 2, 13, 2, 30)
+        array = self.ny.point_array([p._micros])
+        duration = self.chron.months(1).hours(1)
+        self.assertRaises(InvalidOptionValueError, p.plus, duration, 'NaT')
+        self.assertRaises(InvalidOptionValueError, array.plus, duration,
+                          'NaT')
+        self.assertEqual('2016-03-13 04:00:00-04:00',
+                         p.plus(duration, 'shift forward').format())
+
+    def testSpecs(self):
+        spec = self.chron.duration_spec(days=3)
+        self.assertEqual(3, spec.days())
+        frozen = spec.frozen()
+        self.assertIs(spec, spec.days(4))
+        self.assertEqual(3, frozen.days())
+        self.assertRaises(FrozenSpecError, frozen.days, 5)
+        self.assertEqual(4, frozen.clone().days(4).days())
+
+    def testValuesCheckedWhenUsed(self):
+        p = self.ny.point(2016, 1, 31)
+        array = self.ny.point_array([0])
+        for spec in [self.chron.seconds(1.5), self.chron.months(1.5),
+                     self.chron.days('1'),
+                     self.chron.duration_spec(hours=None)]:
+            self.assertRaises(InvalidOptionValueError, p.plus, spec)
+            self.assertRaises(InvalidOptionValueError, p.minus, spec)
+            self.assertRaises(InvalidOptionValueError, array.plus, spec)
+        moved = p.plus(self.chron.seconds(numpy.int64(2)))
+        self.assertIsInstance(moved._micros, int)
+        self.assertEqual(hash(moved), hash(p.plus(self.chron.seconds(2))))
+
+
+class PointSpecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chron = Chron()
+        self.ny = self.chron.line({'time_zone_id': 'America/New_York'})
+
+    def testMatches(self):
+        july_4 = self.chron.month(Chron.JUL).day_of_month(4).compile()
+        self.assertTrue(july_4.matches(self.ny.point(1776, 7, 4, 12)))
+        self.assertFalse(july_4.matches(self.ny.point(1776, 7, 5)))
+        self.assertFalse(july_4.matches(self.ny.positive_infinity()))
+        monday_9 = self.chron.point_spec(day_of_week=Chron.MON, hour=9,
+                                         minute=0).compile()
+        self.assertTrue(monday_9.matches(self.ny.point(2016, 11, 7, 9)))
+        self.assertFalse(monday_9.matches(self.ny.point(2016, 11, 8, 9)))
+        weekend = self.chron.day_of_week({Chron.SAT, Chron.SUN}).compile()
+        self.assertTrue(weekend.matches(self.ny.point(2016, 11, 6)))
+        self.assertTrue(self.chron.point_spec().compile().matches(
+            self.ny.point(2016)))
+
+    def testMaskMatchesPoints(self):
+        rng = random.Random(21)
+        micros = [rng.randrange(-5 * 10 ** 15, 5 * 10 ** 15)
+                  for i in range(3000)] + [POSITIVE_INFINITY]
+        lines = [self.ny, self.chron.line({
+            'time_zone_id': 'UTC', 'leap_seconds': 'UTC leap seconds',
+            'date_system': 'Proleptic Julian calendar'})]
+        specs = [self.chron.point_spec(),
+                 self.chron.day_of_week(Chron.FRI).hour([9, 10, 11]),
+                 self.chron.month(Chron.FEB).day_of_month(29),
+                 self.chron.point_spec(year=range(1900, 2000), minute=30),
+                 self.chron.second(60)]
+        for line in lines:
+            array = line.point_array(micros)
+            for spec in specs:
+                matcher = spec.compile()
+                self.assertEqual([matcher.matches(p) for p in array],
+                                 matcher.mask(array).tolist())
+        leap = lines[1].point(2016, 12, 18, 23, 59, 60)  # Julian date
+        self.assertEqual([True], self.chron.second(60).compile().mask(
+            lines[1].point_array_of([leap])).tolist())
+
+    def testSpecs(self):
+        spec = self.chron.year(2016)
+        self.assertEqual(2016, spec.year())
+        self.assertIsNone(spec.month())
+        self.assertRaises(FrozenSpecError, spec.frozen().month, 1)
+
+
+class TruncationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chron = Chron()
+
+    def line(self, tzid, **options):
+        options['time_zone_id'] = tzid
+        return self.chron.line(options)
+
+    def testDstDays(self):
+        ny = self.line('America/New_York')
+        p = ny.point(2016, 3, 13, 12, 34, 56, 789)
+        self.assertEqual('2016-03-13 00:00:00-05:00',
+                         p.start_of_day().format())
+        self.assertEqual('2016-03-13 12:00:00-04:00',
+                         p.start_of_hour().format())
+        self.assertEqual('2016-03-07 00:00:00-05:00',
+                         p.start_of_week().format())
+        self.assertEqual('2016-03-01 00:00:00-05:00',
+                         p.start_of('month').format())
+        self.assertEqual('2016-01-01 00:00:00-05:00',
+                         p.start_of('year').format())
+        self.assertEqual('2016-03-13 12:35:00-04:00',
+                         p.round_to('minute').format())
+        # 11 hours since the day began, 12 until the next one begins
+        self.assertEqual('2016-03-13 00:00:00-05:00',
+                         ny.point(2016, 3, 13, 12).round_to('day').format())
+        self.assertRaises(InvalidOptionValueError, p.start_of, 'fortnight')
+        sao_paulo = self.line('America/Sao_Paulo')  # midnight was skipped
+        self.assertEqual('2016-10-16 01:00:00-02:00', sao_paulo.point(
+            2016, 10, 16, 12).start_of_day().format())
+        lord_howe = self.line('Australia/Lord_Howe')  # went +10:30 to +11
+        self.assertEqual('2016-10-02 02:30:00+11:00', lord_howe.point(
+            2016, 10, 2, 2, 45).start_of_hour().format())
+
+    def testArraysMatchPoints(self):
+        rng = random.Random(22)
+        micros = [rng.randrange(-3 * 10 ** 15, 3 * 10 ** 15)
+                  for i in range(1000)] + [NEGATIVE_INFINITY]
+        lines = [self.line('America/New_York'),
+                 self.line('Australia/Lord_Howe'),
+                 self.line('UTC', leap_seconds='UTC leap seconds'),
+                 self.line('Europe/Paris', leap_seconds='smear leap seconds')]
+        for line in lines:
+            array = line.point_array(micros)
+            for unit in ['year', 'month', 'week', 'day', 'hour', 'minute',
+                         'second']:
+                self.assertEqual(
+                    [p.start_of(unit)._micros for p in array],
+                    array.start_of(unit).epoch_micros().tolist())
+                self.assertEqual(
+                    [p.round_to(unit)._micros for p in array],
+                    array.round_to(unit).epoch_micros().tolist())
+        leap = lines[2].point(2016, 12, 31, 23, 59, 60, 600000)
+        self.assertEqual('2016-12-31 23:59:00+00:00',
+                         leap.start_of('minute').format())
+        self.assertEqual('2016-12-31 23:59:60+00:00',
+                         leap.start_of('second').format())
+        self.assertEqual('2017-01-01 00:00:00+00:00',
+                         leap.round_to('second').format())
+        self.assertEqual('2016-12-31 23:59:60+00:00', lines[2].point(
+            2016, 12, 31, 23, 59, 59, 600000).round_to('second').format())
+        self.assertEqual('2017-01-01 00:00:00+00:00',
+                         leap.round_to('minute').format())
+
+
+class BulkFieldsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chron = Chron()
+        self.ny = self.chron.line({'time_zone_id': 'America/New_York'})
+
+    def testPolicies(self):
+        # a normal time, a time the clocks went back over, a skipped one
+        days = [1, 6, 13]
+        months = [3, 11, 3]
+        found = {}
+        for policy in ['earlier', 'later', 'shift forward', 'NaT']:
+            points, ambiguous, missing = self.ny.points_from_fields(
+                2016, months, days, [1, 1, 2], 30, policy=policy)
+            self.assertEqual([False, True, False], ambiguous.tolist())
+            self.assertEqual([False, False, True], missing.tolist())
+            found[policy] = [p.format() for p in points]
+        self.assertEqual(['2016-03-01 01:30:00-05:00',
+                          '2016-11-06 01:30:00-04:00',
+                          '2016-03-13 03:30:00-04:00'], found['earlier'])
+        self.assertEqual(['2016-03-01 01:30:00-05:00',
+                          '2016-11-06 01:30:00-05:00',
+                          '2016-03-13 01:30:00-05:00'], found['later'])
+        self.assertEqual(['2016-03-01 01:30:00-05:00',
+                          '2016-11-06 01:30:00-04:00',
+                          '2016-03-13 03:00:00-04:00'],
+                         found['shift forward'])
+        points = self.ny.points_from_fields(
+            2016, months, days, [1, 1, 2], 30, policy='NaT')[0]
+        self.assertEqual('2016-03-01T06:30:00.000000',
+                         str(points.to_datetime64()[0]))
+        self.assertTrue(numpy.isnat(points.to_datetime64()[1:]).all())
+        self.assertRaises(AmbiguousTimeError, self.ny.points_from_fields,
+                          2016, 11, 6, 1, 30, policy='raise')
+        self.assertRaises(NonExistentTimeError, self.ny.points_from_fields,
+                          2016, 3, 13, 2, 30, policy='raise')
+        self.assertRaises(InvalidOptionValueError,
+                          self.ny.points_from_fields, 2016, 1, 1,
+                          policy='nearest')
+
+    def testMatchesPoints(self):
+        rows = 1000
+        rng = numpy.random.default_rng(25)
+        years = rng.integers(1900, 2100, rows)
+        months = rng.integers(1, 13, rows)
+        days = rng.integers(1, 29, rows)
+        hours = rng.integers(0, 24, rows)
+        fractions = rng.integers(0, MICROS_PER_SECOND, rows)
+        for tzid in ['Australia/Lord_Howe', 'Europe/London']:
+            line = self.chron.line({'time_zone_id': tzid})
+            points, ambiguous, missing = line.points_from_fields(
+                years, months, days, hours, 59, 58, fractions)
+            # skipped times come back shifted, so leave them out
+            existing = ~missing
+            points = line.point_array(points.epoch_micros()[existing])
+            self.assertEqual(
+                [(y, m, d, h, 59, 58, f) for y, m, d, h, f in zip(
+                    years[existing].tolist(), months[existing].tolist(),
+                    days[existing].tolist(), hours[existing].tolist(),
+                    fractions[existing].tolist())],
+                list(zip(points.year().tolist(), points.month().tolist(),
+                         points.day_of_month().tolist(),
+                         points.hour().tolist(), points.minute().tolist(),
+                         points.second().tolist(),
+                         points.fraction().tolist())))
+        self.assertRaises(ValueError, self.ny.points_from_fields,
+                          [2016, 2015], 2, 29)
+        utc = self.chron.line({'time_zone_id': 'UTC',
+                               'leap_seconds': 'UTC leap seconds'})
+        points = utc.points_from_fields(2016, 12, 31, 23, 59, [59, 60])[0]
+        self.assertEqual(['2016-12-31 23:59:59+00:00',
+                          '2016-12-31 23:59:60+00:00'],
+                         [p.format() for p in points])
+        self.assertRaises(ValueError, utc.points_from_fields,
+                          2016, 12, 30, 23, 59, 60)
+
+
+class TransitionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chron = Chron()
+        self.ny = self.chron.line({'time_zone_id': 'America/New_York'})
+
+    def testTransitions(self):
+        first = self.ny.point(2016, 1, 1)
+        last = self.ny.point(2017, 1, 1)
+        found = [(p.format(), old // MICROS_PER_HOUR, new // MICROS_PER_HOUR,
+                  abbreviation)
+                 for p, old, new, abbreviation in self.ny.transitions(
+                     first, last)]
+        self.assertEqual([('2016-03-13 03:00:00-04:00', -5, -4, 'EDT'),
+                          ('2016-11-06 01:00:00-05:00', -4, -5, 'EST')],
+                         found)
+        # the interval is half-open, and the points may be on any line
+        spring = next(self.ny.transitions(first, last))[0]
+        utc = self.chron.line({'time_zone_id': 'UTC',
+                               'leap_seconds': 'UTC leap seconds'})
+        self.assertEqual(1, len(list(self.ny.transitions(
+            spring.to(utc), self.ny.point(2016, 11, 6)))))
+        self.assertEqual(0, len(list(self.ny.transitions(
+            first, spring))))
+        self.assertEqual(0, len(list(utc.transitions(first, last))))
+        # an unbounded range streams lazily
+        everything = self.ny.transitions(
+            self.ny.point_array([NEGATIVE_INFINITY])[0],
+            self.ny.point_array([POSITIVE_INFINITY])[0])
+        infos = self.ny.time_zone()._transition_info
+        changes = [info for previous, info in zip(infos, infos[1:])
+                   if info[0] != previous[0]]
+        p, old, new, abbreviation = next(everything)
+        self.assertEqual('EST', abbreviation)
+        self.assertEqual(-5 * MICROS_PER_HOUR, new)
+        self.assertEqual(len(changes) - 1, len(list(everything)))
+
+
+class BucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chron = Chron()
+        self.ny = self.chron.line({'time_zone_id': 'America/New_York'})
+        self.utc = self.chron.line({'time_zone_id': 'Etc/UTC'})
+        rng = random.Random(23)
+        self.micros = [rng.randrange(-3 * 10 ** 15, 3 * 10 ** 15)
+                       for i in range(2000)]
+
+    def testPointArray(self):
+        array = self.ny.point_array(self.micros + [POSITIVE_INFINITY])
+        values = numpy.arange(len(array), dtype=numpy.float64)
+        counts, sums = array.histogram(['day_of_week', 'hour'],
+                                       values=values)
+        self.assertEqual((7, 24), counts.shape)
+        expected = numpy.zeros((7, 24), dtype=numpy.int64)
+        expected_sums = numpy.zeros((7, 24))
+        for i, p in enumerate(array[:-1]):
+            expected[p.day_of_week(), p.hour()] += 1
+            expected_sums[p.day_of_week(), p.hour()] += values[i]
+        self.assertEqual(expected.tolist(), counts.tolist())
+        self.assertEqual(expected_sums.tolist(), sums.tolist())
+        ids = array.bucket_ids(['month', 'day_of_month'])
+        self.assertEqual(-1, ids[-1])
+        p = array[0]
+        self.assertEqual((p.month() - 1) * 31 + p.day_of_month() - 1, ids[0])
+        # on another line the same instants fall in other hours
+        self.assertEqual(
+            [p.to(self.utc).hour() for p in array[:-1]],
+            array.bucket_ids(['hour'], self.utc)[:-1].tolist())
+        self.assertRaises(InvalidOptionValueError, array.bucket_ids,
+                          ['year'])
+
+    def testMixedZones(self):
+        ny = self.ny.point_array(self.micros[:1000])
+        utc = self.utc.point_array(self.micros[1000:])
+        records = self.chron.record_array(
+            utc.to_bytes()[:6000] + ny.to_bytes() + utc.to_bytes()[6000:])
+        expected = [p.hour() for p in records]
+        self.assertEqual(expected, records.bucket_ids(['hour']).tolist())
+        self.assertEqual(numpy.bincount(expected, minlength=24).tolist(),
+                         records.histogram(['hour']).tolist())
+        self.assertEqual(
+            [p.to(self.ny).hour() for p in records],
+            records.bucket_ids(['hour'], self.ny).tolist())
+        self.assertEqual([], records[:0].bucket_ids(['hour']).tolist())
+
+    def testRecordsOnLeapSecondChron(self):
+        chron = Chron({'leap_seconds': 'UTC leap seconds'})
+        line = chron.line({'time_zone_id': 'America/New_York'})
+        records = line.point_array(
+            [line.point(2016, 7, 4, 12)._micros]).record_array()
+        utc = chron.line({'time_zone_id': 'UTC'})
+        for other in [utc, self.utc]:
+            self.assertEqual([records[0].to(other).second()],
+                             records.bucket_ids(['second'], other).tolist())
+            self.assertEqual([16], records.bucket_ids(['hour'],
+                                                      other).tolist())
+
+
+class RecurrenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.berlin = Chron().line({'time_zone_id': 'Europe/Berlin'})
+        self.weekdays = (Chron.MON, Chron.TUE, Chron.WED, Chron.THU, Chron.FRI)
+
+    def testWeekdaysKeepLocalTimeAcrossDst(self):
+        rule = self.berlin.recurrence(9, days_of_week=self.weekdays)
+        # the clocks go forward on Sunday, 27 March 2016
+        points = list(rule.between(self.berlin.point(2016, 3, 24),
+                                   self.berlin.point(2016, 4, 1)))
+        self.assertEqual(['2016-03-24 09:00:00+01:00',
+                          '2016-03-25 09:00:00+01:00',
+                          '2016-03-28 09:00:00+02:00',
+                          '2016-03-29 09:00:00+02:00',
+                          '2016-03-30 09:00:00+02:00',
+                          '2016-03-31 09:00:00+02:00'],
+                         [p.format('%Y-%m-%d %H:%M:%S%:z') for p in points])
+
+    def testUtcLeapSecondLine(self):
+        berlin = Chron().line({'time_zone_id': 'Europe/Berlin',
+                               'leap_seconds': 'UTC leap seconds'})
+        rule = berlin.recurrence(9, days_of_week=self.weekdays)
+        points = list(rule.between(berlin.point(2016, 3, 24, 9),
+                                   self.berlin.point(2016, 3, 29)))
+        self.assertEqual(['2016-03-24 09:00:00+01:00',
+                          '2016-03-25 09:00:00+01:00',
+                          '2016-03-28 09:00:00+02:00'],
+                         [p.format() for p in points])
+        # 09:00 is not yet past at 08:59:59
+        self.assertEqual('2017-01-02 09:00:00+01:00', rule.first_at_or_after(
+            berlin.point(2017, 1, 2, 8, 59, 59)).format())
+
+    def testSkipAheadMatchesWalkingFromStart(self):
+        rule = self.berlin.recurrence(9, 30, days_of_week=self.weekdays)
+        start = self.berlin.point(2016, 1, 1)
+        walked = list(islice(rule.starting_at(start), 600))
+        later = walked[400]
+        skipped = list(islice(rule.starting_at(later), 200))
+        self.assertEqual([p.format() for p in walked[400:]],
+                         [p.format() for p in skipped])
+        just_after = self.berlin.point(later.year(), later.month(),
+                                       later.day_of_month(), 9, 30, 0, 1)
+        self.assertEqual(walked[401].format(),
+                         rule.first_at_or_after(just_after).format())
+
+    def testMonthAndDayFilters(self):
+        rule = self.berlin.recurrence(days_of_month=[29], months=[Chron.FEB])
+        points = list(islice(rule.starting_at(self.berlin.point(2001)), 3))
+        self.assertEqual([2004, 2008, 2012], [p.year() for p in points])
+        never = self.berlin.recurrence(days_of_month=[30], months=[Chron.FEB])
+        self.assertIsNone(never.first_at_or_after(self.berlin.point(2001)))
+
+    def testGapAndOverlapPolicies(self):
+        start = self.berlin.point(2016, 3, 1)
+
+        def first(policy, month):
+            # the last Sunday of the month is when the clocks change
+            day = {Chron.MAR: 27, Chron.OCT: 30}[month]
+            rule = self.berlin.recurrence(2, 30, policy=policy,
+                                          months=[month], days_of_month=[day])
+            return rule.first_at_or_after(start).format('%m-%d %H:%M%:z')
+
+        self.assertEqual('03-27 03:00+02:00',
+                         first('shift forward', Chron.MAR))
+        self.assertEqual('03-27 03:30+02:00', first('earlier', Chron.MAR))
+        self.assertEqual('03-27 01:30+01:00', first('later', Chron.MAR))
+        self.assertEqual('10-30 02:30+02:00',
+                         first('shift forward', Chron.OCT))
+        self.assertEqual('10-30 02:30+01:00', first('later', Chron.OCT))
+        self.assertRaises(NonExistentTimeError, first, 'raise', Chron.MAR)
+        self.assertRaises(AmbiguousTimeError, first, 'raise', Chron.OCT)
+        self.assertRaises(InvalidOptionValueError,
+                          self.berlin.recurrence, policy='sometimes')
+
+
+class ChronIntervalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.line = Chron().line({'time_zone_id': 'UTC'})
+
+    def testThrough(self):
+        interval = self.line.point(2016, 7, 4).through(
+            self.line.point(2016, 7, 5))
+        self.assertEqual(4, interval.first().day_of_month())
+        self.assertEqual(5, interval.last().day_of_month())
+        self.assertTrue(interval.contains(self.line.point(2016, 7, 4, 12)))
+        self.assertFalse(interval.contains(self.line.point(2016, 7, 5)))
+        self.assertRaises(InvalidIntervalError, self.line.point(2016).through,
+                          self.line.point(2015))
+
+    def testOverlaps(self):
+        p = [self.line.point(2016, 1, d) for d in range(1, 6)]
+        self.assertTrue(p[0].through(p[2]).overlaps(p[1].through(p[3])))
+        self.assertFalse(p[0].through(p[1]).overlaps(p[1].through(p[3])))
+        self.assertFalse(p[0].through(p[3]).overlaps(p[1].through(p[1])))
+
+    def testAcrossLeapSecondTimescales(self):
+        leap = Chron().line({'time_zone_id': 'UTC',
+                             'leap_seconds': 'UTC leap seconds'})
+        p = [self.line.point(2016, 1, d) for d in range(1, 6)]
+        q = [x.to(leap) for x in p]
+        self.assertTrue(p[0].through(p[1]).contains(q[0]))
+        self.assertFalse(p[0].through(p[1]).contains(q[1]))
+        self.assertTrue(q[0].through(q[1]).contains(p[0]))
+        self.assertFalse(p[0].through(p[1]).overlaps(q[1].through(q[3])))
+        self.assertTrue(p[0].through(p[2]).overlaps(q[1].through(q[3])))
+        self.assertRaises(InvalidIntervalError, p[1].through, q[0])
+
+
+class ChronIntervalSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.line = Chron().line({'time_zone_id': 'Europe/Paris'})
+        rng = random.Random(42)
+        self.firsts = [rng.randrange(1000) for i in range(400)]
+        self.lasts = [first + rng.choice([0, 1, 5, 20, 300])
+                      for first in self.firsts]
+        self.set = self.line.interval_set(self.line.point_array(self.firsts),
+                                          self.line.point_array(self.lasts))
+        self.queries = [(a, a + rng.choice([0, 1, 10, 100]))
+                        for a in range(-5, 1400, 7)]
+
+    def interval(self, first, last):
+        return self.line.point_array([first])[0].through(
+            self.line.point_array([last])[0])
+
+    def check(self, method, predicate):
+        for a, b in self.queries:
+            expected = [i for i, (s, e) in
+                        enumerate(zip(self.firsts, self.lasts))
+                        if predicate(s, e, a, b)]
+            self.assertEqual(
+                expected, method(self.interval(a, b)).tolist(), (a, b))
+
+    def nest(self):
+        # intervals around a few centres, mostly nested many deep
+        rng = random.Random(1066)
+        self.firsts = []
+        self.lasts = []
+        for i in range(400):
+            centre = rng.choice([300, 700, 1000])
+            self.firsts.append(centre - rng.randrange(300))
+            self.lasts.append(centre + rng.choice([0, 1, 5, 20, 300]) *
+                              rng.randrange(3))
+        self.set = self.line.interval_set(self.line.point_array(self.firsts),
+                                          self.line.point_array(self.lasts))
+        self.assertIsNone(self.set.layer_count())
+
+    def testContainingPoint(self):
+        self.check(lambda interval: self.set.containing_point(
+                       interval.first()),
+                   lambda s, e, a, b: s <= a < e)
+
+    def testOverlapping(self):
+        self.check(self.set.overlapping,
+                   lambda s, e, a, b: s < b and a < e and s < e and a < b)
+
+    def testContaining(self):
+        self.check(self.set.containing,
+                   lambda s, e, a, b: s <= a and b <= e)
+
+    def testWithin(self):
+        self.check(self.set.within,
+                   lambda s, e, a, b: a <= s and e <= b)
+
+    def testNestedIntervals(self):
+        self.nest()
+        self.testContainingPoint()
+        self.testOverlapping()
+        self.testContaining()
+        self.testWithin()
+        empty = self.line.interval_set(self.line.point_array([]),
+                                       self.line.point_array([]))
+        self.assertEqual([], empty.containing_point(
+            self.line.point(2016)).tolist())
+
+    def testLayers(self):
+        firsts = self.line.point_array([0, 1, 2, 3, 0])
+        lasts = self.line.point_array([10, 2, 3, 4, 10])
+        self.assertEqual(2, self.line.interval_set(firsts, lasts
+                                                   ).layer_count())
+        disjoint = self.line.point_array(range(0, 100, 10))
+        self.assertEqual(1, self.line.interval_set(disjoint, disjoint
+                                                   ).layer_count())
+        nested = self.line.interval_set(
+            self.line.point_array(range(9)),
+            self.line.point_array(range(18, 9, -1)))
+        self.assertIsNone(nested.layer_count())
+        self.assertEqual(list(range(9)), nested.containing_point(
+            self.line.point_array([8])[0]).tolist())
+
+    def cells(self, interval_set):
+        # which unit cells [t, t + 1) the set covers
+        return set(t for interval in interval_set
+                   for t in range(interval.first()._micros,
+                                  interval.last()._micros))
+
+    def randomSet(self, rng, line, count):
+        firsts = [rng.randrange(200) for i in range(count)]
+        lasts = [first + rng.randrange(30) for first in firsts]
+        return line.interval_set(line.point_array(firsts),
+                                 line.point_array(lasts))
+
+    def testSetAlgebra(self):
+        rng = random.Random(7)
+        tokyo = Chron().line({'time_zone_id': 'Asia/Tokyo'})
+        for trial in range(20):
+            a = self.randomSet(rng, self.line, rng.randrange(12))
+            b = self.randomSet(rng, tokyo, rng.randrange(12))
+            for result, expected in [
+                    (a.union(b), self.cells(a) | self.cells(b)),
+                    (a.intersection(b), self.cells(a) & self.cells(b)),
+                    (a.difference(b), self.cells(a) - self.cells(b)),
+                    (a.complement(self.interval(50, 150)),
+                     set(range(50, 150)) - self.cells(a))]:
+                self.assertIs(self.line, result.line())
+                self.assertEqual(expected, self.cells(result))
+                firsts = result.firsts().epoch_micros()
+                lasts = result.lasts().epoch_micros()
+                self.assertTrue((firsts < lasts).all())
+                self.assertTrue((lasts[:-1] < firsts[1:]).all())
+
+    def testAcrossLeapSecondTimescales(self):
+        utc = Chron().line({'time_zone_id': 'UTC'})
+        leap = Chron().line({'time_zone_id': 'UTC',
+                             'leap_seconds': 'UTC leap seconds'})
+        p = utc.point(2016, 7, 4, 12)
+        minute = [p.through(utc.point(2016, 7, 4, 12, 1))]
+        sets = [utc.interval_set_of(minute), leap.interval_set_of(minute)]
+        self.assertEqual(['2016-07-04 12:00:00+00:00'],
+                         [i.first().format() for i in
+                          sets[0].intersection(sets[1])])
+        self.assertEqual(['2016-07-04 12:00:00+00:00'],
+                         [i.first().format() for i in
+                          sets[1].intersection(sets[0])])
+        self.assertEqual(0, len(sets[0].difference(sets[1])))
+        self.assertEqual([0], sets[1].containing_point(p).tolist())
+        self.assertEqual([0], sets[1].within(minute[0]).tolist())
+        self.assertEqual([0], sets[1].containing(minute[0]).tolist())
+        self.assertEqual([0], sets[1].overlapping(minute[0]).tolist())
+        bulk = leap.interval_set(utc.point_array([p._micros]),
+                                 utc.point_array([p._micros + 60000000]))
+        self.assertEqual(sets[1].firsts().epoch_micros().tolist(),
+                         bulk.firsts().epoch_micros().tolist())
+
+    def testComplementToInfinity(self):
+        a = self.line.interval_set(self.line.point_array([10, 30]),
+                                   self.line.point_array([20, 40]))
+        complement = list(a.complement())
+        self.assertEqual(3, len(complement))
+        self.assertEqual('-infinity', complement[0].first().format())
+        self.assertEqual('infinity', complement[2].last().format())
+        self.assertTrue(complement[2].last().is_infinite())
+        self.assertFalse(complement[2].first().is_infinite())
+        self.assertRaises(InfinitePointError, complement[2].last().year)
+        self.assertEqual(0, len(a.complement().complement().difference(a)))
+
+    def testBulkAndItems(self):
+        intervals = list(self.set)
+        copy = self.line.interval_set_of(intervals)
+        self.assertEqual(len(self.set), len(copy))
+        self.assertEqual(self.lasts, copy.lasts().epoch_micros().tolist())
+        self.assertEqual(self.firsts[3], self.set[3].first()._micros)
+        self.assertEqual(0, len(self.line.interval_set_of([])))
+
 
 class ChronClockTest(unittest.TestCase):
 
     def setUp(self):
-        self.clock = ChronClock('line')
+        self.line = Chron().line({'time_zone_id': 'UTC'})
+        self.clock = ChronClock(self.line)
+
+    def testReadIsNow(self):
+        epoch = EPOCH.replace(tzinfo=datetime_timezone.utc)
+        before = micros_from_timedelta(
+            datetime.now(datetime_timezone.utc) - epoch)
+        p = self.clock.read()
+        after = micros_from_timedelta(
+            datetime.now(datetime_timezone.utc) - epoch)
+        self.assertIs(self.line, p._parent)
+        self.assertTrue(before - 1000 <= p._micros <= after + 1000)
+
+    def testReadOnOtherLine(self):
+        tokyo = Chron().line({'time_zone_id': 'Asia/Tokyo'})
+        self.assertIs(tokyo, self.clock.read(tokyo)._parent)
+
+    def testTickCachesPoint(self):
+        clock = ChronClock(self.line, tick=3600 * 1000000)
+        p = clock.read()
+        self.assertEqual(0, p.minute())
+        self.assertEqual(0, p.fraction())
+        # on a clock that stands still, reads within the hour share a point
+        start = self.line.point(2016, 7, 4, 12, 20)
+        clock = ChronSimulatedClock(self.line, start, tick=3600 * 1000000)
+        p = clock.read()
+        clock.advance(30 * 60 * 1000000)
+        self.assertIs(p, clock.read())
+        clock.advance(10 * 60 * 1000000)
+        self.assertEqual('2016-07-04 13:00:00+00:00', clock.read().format())
+        self.assertRaises(InvalidOptionValueError, ChronClock, self.line, 0)
+
+    def testReadManyIncreases(self):
+        first = self.clock.read_many(1000)
+        second = self.clock.read_many(1000)
+        stamps = numpy.concatenate([first.epoch_micros(),
+                                    second.epoch_micros()])
+        self.assertEqual(2000, len(stamps))
+        self.assertTrue((numpy.diff(stamps) > 0).all())
+        self.assertIs(self.line, first.line())
+
+
+class ChronSimulatedClockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.berlin = Chron().line({'time_zone_id': 'Europe/Berlin'})
+        self.start = self.berlin.point(2016, 3, 26, 23)
+        self.clock = ChronSimulatedClock(self.berlin, self.start)
+
+    def testAdvance(self):
+        self.assertEqual('2016-03-26 23:00:00+01:00',
+                         self.clock.read().format())
+        self.clock.advance(4 * 3600 * 1000000)  # across the spring gap
+        self.assertEqual('2016-03-27 04:00:00+02:00',
+                         self.clock.read().format())
+        self.assertRaises(InvalidOptionValueError, self.clock.advance, -1)
+        stamps = self.clock.read_many(3).epoch_micros()
+        self.assertEqual(self.clock.read_micros(), stamps[0])
+
+    def testRunDeadlinesInOrder(self):
+        fired = []
+        rule = self.berlin.recurrence(2, 30)
+        for p in islice(rule.starting_at(self.start), 3):
+            self.clock.schedule(p, lambda p: fired.append(
+                self.clock.read().format('%d %H:%M%:z')))
+        self.clock.schedule(self.start, fired.append)
+        self.assertIs(self.start, self.clock.next_deadline())
+        self.assertIs(self.start, self.clock.run_next())
+        self.clock.run_until(self.berlin.point(2016, 3, 28, 12))
+        self.assertEqual(['27 03:00+02:00', '28 02:30+02:00'], fired[1:])
+        self.assertEqual('2016-03-28 12:00:00+02:00',
+                         self.clock.read().format())
+        self.clock.run_next()
+        self.assertEqual('29 02:30+02:00', fired[-1])
+        self.assertIsNone(self.clock.run_next())
+
+    def testUtcLeapSecondLine(self):
+        leap = Chron().line({'time_zone_id': 'Europe/Berlin',
+                             'leap_seconds': 'UTC leap seconds'})
+        clock = ChronSimulatedClock(leap, leap.point(2016, 7, 4, 12))
+        self.assertEqual('2016-07-04 12:00:00+02:00', clock.read().format())
+        self.assertEqual('2016-07-04 12:00:00+02:00',
+                         clock.read(self.berlin).format())
+        fired = []
+        clock.schedule(leap.point(2016, 7, 4, 12, 30), fired.append)
+        clock.schedule(self.berlin.point(2016, 7, 4, 12, 45), fired.append)
+        clock.run_until(leap.point(2016, 7, 4, 12, 40))
+        self.assertEqual(['2016-07-04 12:30:00+02:00'],
+                         [p.format() for p in fired])
+        self.assertEqual('2016-07-04 12:40:00+02:00', clock.read().format())
+        clock.advance_to(self.berlin.point(2016, 7, 4, 13))
+        self.assertEqual('2016-07-04 13:00:00+02:00', clock.read().format())
 
 
 if __name__ == '__main__':